@@ -0,0 +1,45 @@
+#
+# An example NTRU implementation.  The NTRU code itself is in core.py (with
+# the polynomial multiplication backends in multiply.py); __main__.py has the
+# command line ('python -m ntru'), which by default runs an example key
+# exchange
+#
+# Importing this package is meant to be cheap, so that a program that only
+# wants to, say, encapsulate to one public key doesn't pay for everything
+# else: nothing here does any NTRU operations when imported, the tables
+# some operations use are built the first time they're needed, NumPy is
+# only imported when the numpy arithmetic is asked for, and the key pool
+# (and so multiprocessing), the key store, the key ring, the daemon, the
+# instrumentation and the benchmarks are only imported when they are first
+# used.  See bench.import_time_budget
+from .core import (mod3, hash_two_strings, parameter_sets, NTRU_base,
+                   NTRU_prepared_publickey, NTRU_publickey, NTRU_privatekey)
+from .multiply import (multiply_backends, default_multiply_backend,
+                       NTRU_prepared_polynomial)
+from .rng import NTRU_system_random, NTRU_shake_drbg, NTRU_aes_ctr_drbg
+
+#
+# The names we import from a submodule the first time someone uses them
+lazy_names = {
+    'generate_keypair': 'keypool',
+    'NTRU_keypool': 'keypool',
+    'benchmark_table': 'bench',
+    'run_benchmarks': 'bench',
+    'compare_benchmarks': 'bench',
+    'measure_import_time': 'bench',
+    'NTRU_keystore': 'keystore',
+    'write_keystore': 'keystore',
+    'NTRU_async': 'aio',
+    'NTRU_instrumentation': 'instrument',
+    'NTRU_daemon': 'daemon',
+    'NTRU_daemon_client': 'daemon',
+    'NTRU_keyring': 'keyring',
+}
+
+def __getattr__(name):
+    # Python calls this for any name the package doesn't (yet) have
+    if name in lazy_names:
+        import importlib
+        module = importlib.import_module('.' + lazy_names[name], __name__)
+        return getattr(module, name)
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
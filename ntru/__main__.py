@@ -0,0 +1,369 @@
+#
+# The command line for our NTRU implementation ('python -m ntru'); with no
+# arguments, this runs the demonstration key exchange
+import sys        # For stdin, stdout and the exit status
+import json       # For the JSON lines format
+import time       # To time the bench command
+import struct     # For the length prefixes of the binary format
+import argparse   # For the command line
+import collections      # For the jobs in progress, in order
+import concurrent.futures   # To spread the work over several processes
+from ntru import NTRU_privatekey, NTRU_publickey
+from ntru.rng import NTRU_shake_drbg
+
+def demo(parameter_set):
+    # Here is a quick example; a key exchange between Alice and Bob
+    # The convention this uses is: everything Alice owns is prefixed by 'a_'
+    # Everything Bob owns is prefixed by 'b_'
+
+    # Step 1: Alice creates her private/public key:
+    a_privkey = NTRU_privatekey( parameter_set )
+    a_pubkey = a_privkey.key_gen()
+
+    # Step 2: Alice sends her public key as a keyshare
+    b_keyshare = a_pubkey
+    # print( 'Alice sends her public key:' );
+    # print( b_keyshare.hex() )
+
+    # Step 3: Bob creates a shared secret/ciphertext based on
+    # the keyshare he got from Alice
+    b_pubkey = NTRU_publickey( parameter_set )
+    (b_ciphertext, b_sharedsecret) = b_pubkey.kem_encapsulate(b_keyshare)
+
+    # Step 4: Bob sends his ciphertext as a keyshare
+    a_keyshare = b_ciphertext
+    # print( 'Bob sends his ciphertext:' );
+    # print( a_keyshare.hex() )
+
+    # Step 5: Alice generates her shared secret from the keyshare she got
+    # from Bob
+    a_sharedsecret = a_privkey.kem_decapsulate(a_keyshare)
+
+    # And at the end, we compare the two shared secrets
+    print( 'Alice computes this shared secret:' );
+    print( a_sharedsecret.hex() )
+    print( 'Bob computes this shared secret:' );
+    print( b_sharedsecret.hex() )
+    if a_sharedsecret == b_sharedsecret:
+        print( 'It worked!' )   # Actually, we shouldn't be that surprised...
+
+#
+# The commands, for generating test data in bulk:
+#   keygen   generate --count keypairs; each output record is the packed
+#            public key and the packed private key (as pack_private_key
+#            encodes it, which is also what NTRU_privatekey.save writes)
+#   encaps   encapsulate to a public key; each output record is the
+#            ciphertext and the shared secret.  We do --count encapsulations
+#            (by default, one): with --public-key, to the public key in that
+#            file; otherwise, we read records (say, the output of keygen)
+#            from --input, and do them to the public key that each one
+#            starts with
+#   decaps   read records (say, the output of encaps) from --input, and
+#            decapsulate the ciphertext each one starts with, with the
+#            private key in the file --private-key; each output record is
+#            the shared secret
+#   bench    time --count of each of key generation, encapsulation and
+#            decapsulation, spread over --jobs processes, and print how
+#            many of each we did per second
+#   serve    serve the keys in the key store --keystore on the Unix domain
+#            socket --socket, with --jobs worker processes (see daemon.py)
+#   demo     the example key exchange
+#
+# The records are written to --output (by default, stdout), and read from
+# --input (by default, stdin), as they are produced or needed; so the
+# memory we use doesn't depend on --count, and a pipeline such as
+#   python -m ntru keygen --count 1000 | python -m ntru encaps
+# starts producing ciphertexts long before the keys are all generated.
+# There are two formats:
+#   binary   each record is its length (4 bytes, big endian), and then
+#            each of its fields, as its length (4 bytes, big endian) and
+#            its bytes
+#   json     each record is a line holding a JSON object, with each field
+#            as a hex string (under the names in record_fields)
+#
+# The work is done in chunks of --batch items (a chunk of keys is
+# generated with key_gen_many, and, with the numpy arithmetic, the
+# encapsulations and decapsulations in a chunk are done as one batch).
+# With --jobs, the chunks are spread over that many worker processes; we
+# keep at most two chunks per worker in progress at once, which keeps
+# every worker busy without reading (or holding the results of) everything
+# ahead.  The output is in the same order as the input, unless --unordered
+# is given, in which case each chunk is written as soon as it is done
+# --seed makes the output repeatable (whatever --jobs is, as long as --batch
+# is the same, and the output is in order): each chunk gets its own
+# NTRU_shake_drbg, seeded with the seed and the chunk's number
+record_fields = {
+    'keygen': ('public_key', 'private_key'),
+    'encaps': ('ciphertext', 'shared_secret'),
+    'decaps': ('shared_secret',),
+}
+length_prefix = struct.Struct('>I')
+
+def write_record(file, format, command, fields):
+    # Write the record fields (a sequence of bytes-like objects) to file
+    if format == 'json':
+        file.write(json.dumps(dict(zip(record_fields[command],
+                                       [field.hex() for field in fields])))
+                   .encode('ascii') + b'\n')
+        return
+    record = bytearray()
+    for field in fields:
+        record += length_prefix.pack(len(field))
+        record += field
+    file.write(length_prefix.pack(len(record)) + record)
+
+def read_records(file, format):
+    # Return an iterator over the records in file; each is a list of its
+    # fields (as bytes)
+    if format == 'json':
+        for line in file:
+            if line.strip():
+                yield [bytes.fromhex(value)
+                       for value in json.loads(line).values()]
+        return
+    while True:
+        prefix = file.read(length_prefix.size)
+        if not prefix:
+            return
+        if len(prefix) != length_prefix.size:
+            raise ValueError    # The input was cut short
+        length, = length_prefix.unpack(prefix)
+        record = file.read(length)
+        if len(record) != length:
+            raise ValueError    # The input was cut short
+        fields = []
+        offset = 0
+        while offset < length:
+            size, = length_prefix.unpack_from(record, offset)
+            offset = offset + length_prefix.size
+            fields.append(record[offset:offset+size])
+            offset = offset + size
+        if offset != length:
+            raise ValueError    # A field runs past the end of its record
+        yield fields
+
+def run_chunk(command, parameter_set, options, packed_key, seed, index,
+              arguments):
+    # Do one chunk of work (in a worker process, if there are any), and
+    # return the list of output records.  arguments is the number of
+    # keypairs to generate (for keygen), or the list of public keys or
+    # ciphertexts
+    from ntru.aio import worker_ntru, run_batch
+    ntru = worker_ntru(parameter_set, options, packed_key)
+    if seed is not None:
+        ntru.rng = NTRU_shake_drbg(seed + b'/%d' % index)
+    if command == 'keygen':
+        return [(bytes(public_key), bytes(key.pack_private_key()))
+                for key, public_key in ntru.key_gen_many(arguments)]
+    if command == 'encaps':
+        return [(bytes(C), bytes(K))
+                for C, K in run_batch(ntru, 'kem_encapsulate', arguments)]
+    return [(bytes(K),)
+            for K in run_batch(ntru, 'kem_decapsulate', arguments)]
+
+def run_chunks(chunks, jobs, ordered):
+    # chunks is an iterator over the argument tuples for run_chunk; return
+    # an iterator over the lists of records they give, running them in jobs
+    # worker processes (or in this one, if jobs is 1)
+    if jobs == 1:
+        for chunk in chunks:
+            yield run_chunk(*chunk)
+        return
+    with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+        pending = collections.deque()
+        for chunk in chunks:
+            if len(pending) >= 2*jobs:
+                yield from finished_chunks(pending, ordered)
+            pending.append(executor.submit(run_chunk, *chunk))
+        while pending:
+            yield from finished_chunks(pending, ordered)
+
+def finished_chunks(pending, ordered):
+    # Wait for the next chunk (of the deque of futures pending) to be done,
+    # and return the records from it; or, if not ordered, for any of them,
+    # and return the records from every one that's done
+    if ordered:
+        return [pending.popleft().result()]
+    done, _ = concurrent.futures.wait(
+                  pending, return_when=concurrent.futures.FIRST_COMPLETED)
+    for future in done:
+        pending.remove(future)
+    return [future.result() for future in done]
+
+def make_chunks(command, args, options, packed_key=None, inputs=None):
+    # Return an iterator over the argument tuples for run_chunk that do the
+    # work for command: for keygen, args.count keypairs; for encaps and
+    # decaps, the items in the iterator inputs (the public keys or the
+    # ciphertexts)
+    index = 0
+    if command == 'keygen':
+        for start in range(0, args.count, args.batch):
+            yield (command, args.set, options, packed_key, args.seed, index,
+                   min(args.batch, args.count - start))
+            index = index + 1
+        return
+    chunk = []
+    for item in inputs:
+        chunk.append(item)
+        if len(chunk) == args.batch:
+            yield (command, args.set, options, packed_key, args.seed, index,
+                   chunk)
+            chunk = []
+            index = index + 1
+    if chunk:
+        yield (command, args.set, options, packed_key, args.seed, index,
+               chunk)
+
+def command_inputs(command, args, input):
+    # Return an iterator over what encaps or decaps works on
+    if command == 'encaps' and args.public_key:
+        with open(args.public_key, 'rb') as file:
+            public_key = file.read()
+        return (public_key for _ in range(args.count))
+    count = 1 if command == 'decaps' else args.count
+    return (record[0] for record in read_records(input, args.format)
+                      for _ in range(count))
+
+def bench(args, options):
+    # Time each of the operations, args.count times, spread over args.jobs
+    # processes, and print how many we did per second
+    print('%-12s %-8s %8s %5s %10s' % ('set', 'command', 'count', 'jobs',
+                                       'per sec'))
+    def timed(command, packed_key=None, inputs=None):
+        start = time.perf_counter()
+        results = []
+        for records in run_chunks(make_chunks(command, args, options,
+                                              packed_key, inputs),
+                                  args.jobs, not args.unordered):
+            results.extend(records)
+        elapsed = time.perf_counter() - start
+        print('%-12s %-8s %8d %5d %10.1f' % (args.set, command, args.count,
+                                             args.jobs,
+                                             args.count / elapsed))
+        return results
+    keypairs = timed('keygen')
+    public_key, private_key = keypairs[0]
+    ciphertexts = timed('encaps', None, [public_key] * args.count)
+    timed('decaps', private_key, [C for C, _ in ciphertexts])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m ntru',
+                                     description='NTRU key generation, '
+                                     'encapsulation and decapsulation')
+    parser.add_argument('command', nargs='?', default='demo',
+                        choices=('keygen', 'encaps', 'decaps', 'bench',
+                                 'serve', 'demo'))
+    parser.add_argument('--set', default='hps2048677',
+                        help='parameter set (default: hps2048677)')
+    parser.add_argument('--count', type=int,
+                        help='how many keypairs or encapsulations (default: '
+                             '1 (for encaps, for each public key read), or '
+                             '1000 for bench)')
+    parser.add_argument('--jobs', type=int,
+                        help='worker processes to use (default: 1, which '
+                             'does the work in this process; for serve, one '
+                             'per processor)')
+    parser.add_argument('--batch', type=int, default=64,
+                        help='items in each chunk of work (default: 64)')
+    parser.add_argument('--unordered', action='store_true',
+                        help='write each chunk as soon as it is done, rather '
+                             'than in order')
+    parser.add_argument('--format', choices=('binary', 'json'),
+                        default='binary',
+                        help='record format (default: binary)')
+    parser.add_argument('--input', help='file to read (default: stdin)')
+    parser.add_argument('--output', help='file to write (default: stdout)')
+    parser.add_argument('--public-key',
+                        help='file holding the public key to encapsulate to')
+    parser.add_argument('--private-key',
+                        help='file holding the private key to decapsulate '
+                             'with (as NTRU_privatekey.save writes it)')
+    parser.add_argument('--socket',
+                        help='Unix domain socket for serve to listen on')
+    parser.add_argument('--keystore',
+                        help='key store holding the keys for serve')
+    parser.add_argument('--config',
+                        help='arithmetic configuration (see python -m '
+                             'ntru.bench; default: the package default)')
+    parser.add_argument('--seed', type=lambda s: s.encode(),
+                        help='seed the random choices, to make the output '
+                             'repeatable')
+    args = parser.parse_args(argv)
+    command = args.command
+    if command == 'demo':
+        demo(args.set)
+        return 0
+    if (args.jobs is not None and args.jobs < 1) or args.batch < 1 or \
+            (args.count is not None and args.count < 0):
+        parser.error('--jobs and --batch must be at least 1, and --count '
+                     'at least 0')
+
+    options = {}
+    if args.config:
+        from ntru.bench import configurations
+        available = configurations()
+        if args.config not in available:
+            parser.error('--config must be one of %s' %
+                         ', '.join(available))
+        options = available[args.config]
+
+    if command == 'serve':
+        if not args.socket or not args.keystore:
+            parser.error('serve needs --socket and --keystore')
+        from ntru.keystore import NTRU_keystore
+        from ntru.daemon import NTRU_daemon
+        NTRU_daemon(args.socket, NTRU_keystore(args.keystore, **options),
+                    args.jobs, args.batch).serve_forever()
+        return 0
+
+    args.jobs = args.jobs or 1
+    NTRU_privatekey(args.set, **options)    # Check the parameters now,
+                                            # rather than in the workers
+
+    if command == 'bench':
+        if args.count is None:
+            args.count = 1000
+        if args.count < 1:
+            parser.error('bench needs --count at least 1')
+        bench(args, options)
+        return 0
+
+    packed_key = None
+    if command == 'decaps':
+        if not args.private_key:
+            parser.error('decaps needs --private-key')
+        with open(args.private_key, 'rb') as file:
+            packed_key = file.read()
+    if command in ('keygen', 'encaps') and args.count is None:
+        args.count = 1
+
+    source = open(args.input, 'rb') if args.input else sys.stdin.buffer
+    input = source
+    if args.format == 'json':
+        input = (line.decode('ascii') for line in source)
+    output = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        inputs = None
+        if command != 'keygen':
+            inputs = command_inputs(command, args, input)
+        for records in run_chunks(make_chunks(command, args, options,
+                                              packed_key, inputs),
+                                  args.jobs, not args.unordered):
+            for fields in records:
+                write_record(output, args.format, command, fields)
+            output.flush()
+    except BrokenPipeError:
+        # (whoever was reading the output has gone; that's not an error)
+        sys.stderr.close()
+    finally:
+        if args.input:
+            source.close()
+        if args.output:
+            output.close()
+    return 0
+
+if __name__ == '__main__':
+    # With no command, this runs the demonstration with
+    # parameter_set = 'hps2048677' (or --set); the others are
+    # 'hps2048509', 'hps4096821', ..., and 'tiny'
+    sys.exit(main())
@@ -0,0 +1,252 @@
+#
+# An asyncio interface to NTRU
+import os         # To find out how many processors we have
+import asyncio    # For the event loop side of things
+import pickle     # To check that the workers can be given the options
+import concurrent.futures   # For the thread and process executors
+from .core import NTRU_privatekey
+from .keypool import generate_keypair
+
+#
+# The NTRU operations are CPU bound, and take milliseconds; called directly
+# from a coroutine, they stop the event loop for that long.  NTRU_async runs
+# them in an executor instead (a thread pool, a process pool, or one the
+# caller supplies), and lets the coroutine await the result
+#
+# Each kind of operation (key_gen, kem_encapsulate, kem_decapsulate) has its
+# own bounded queue of waiting requests, and a few dispatcher tasks that
+# take requests off it and hand them to the executor:
+#  - If the NTRU object has batched versions of the operation (the numpy
+#    arithmetic does; see kem_decapsulate_many), a dispatcher takes every
+#    request that is waiting (up to max_batch) and runs them as one batch
+#  - There are as many dispatchers (for each operation) as executor
+#    workers, so at most that many batches are running at once
+#  - When the queue is full, callers wait to get into it.  So, if requests
+#    come in faster than we can serve them, the callers are held up (which
+#    is something the server can see, and act on), rather than the queue,
+#    and the time each request spends in it, growing without limit
+#
+# With a process pool, the private key is sent along with each batch (as
+# pack_private_key encodes it); each worker unpacks it when it first sees
+# it, and keeps it until it sees a different one
+
+worker_key = [None, None]   # In a worker process: the last packed private
+                            # key we were sent, and the NTRU object for it
+
+def worker_ntru(parameter_set, options, packed_key):
+    # Return (in a worker process) the NTRU object to use for packed_key
+    if worker_key[0] != packed_key or worker_key[1] is None:
+        ntru = NTRU_privatekey(parameter_set, **options)
+        if packed_key is not None:
+            ntru.unpack_private_key(packed_key)
+        worker_key[:] = [packed_key, ntru]
+    return worker_key[1]
+
+def run_batch(ntru, operation, arguments):
+    # Run the operation on each of the arguments (a list), in one go if ntru
+    # has a batched version, and return the list of results
+    if ntru.use_numpy and len(arguments) > 1:
+        return getattr(ntru, operation + '_many')(arguments)
+    return [getattr(ntru, operation)(argument) for argument in arguments]
+
+def run_batch_in_worker(parameter_set, options, packed_key, operation,
+                        arguments):
+    # The same, in a worker process
+    ntru = worker_ntru(parameter_set, options, packed_key)
+    return run_batch(ntru, operation, arguments)
+
+class NTRU_async:
+    #
+    # executor is 'thread' (the default), 'process', or a
+    # concurrent.futures executor to use; workers is how many workers to
+    # start for 'thread' or 'process' (by default, 1 thread, or one process
+    # per processor), or that the executor we're given has.  For a thread
+    # pool, the GIL means that only one operation runs at a time, but the
+    # event loop is free to do everything else; a process pool actually runs
+    # operations in parallel
+    # queue_size is how many requests (of each kind) may wait; max_batch is
+    # the most requests we run as one batch (by default, 32 if we have
+    # batched operations, and 1 if not)
+    #
+    # Any extra keyword arguments are passed to NTRU_privatekey (for
+    # example, multiply_backend or arithmetic)
+    #
+    # This holds a private key (ntru.F, and so on) for kem_decapsulate to
+    # use; key_gen generates a new one (and returns its public key), or
+    # set_private_key installs one
+
+    def __init__(self, parameter_set, executor='thread', workers=None,
+                 queue_size=256, max_batch=None, **options):
+        if queue_size < 1:
+            raise ValueError    # There must be room for one request
+        self.parameter_set = parameter_set
+        self.options = options
+        self.ntru = NTRU_privatekey(parameter_set, **options)
+        self.packed_key = None      # The private key, for the workers
+        self.public_key = None
+        if max_batch is None:
+            max_batch = 32 if self.ntru.use_numpy else 1
+        self.max_batch = max_batch
+        self.queue_size = queue_size
+
+        self.own_executor = not isinstance(executor,
+                                           concurrent.futures.Executor)
+        if executor == 'thread':
+            workers = workers or 1
+            executor = concurrent.futures.ThreadPoolExecutor(workers)
+            self.processes = False
+        elif executor == 'process':
+            pickle.dumps(options)   # Check that we can send them to the
+                                    # workers (a seeded DRBG, for one,
+                                    # can't be)
+            workers = workers or os.cpu_count()
+            executor = concurrent.futures.ProcessPoolExecutor(workers)
+            self.processes = True
+        elif not self.own_executor:
+            workers = workers or 1
+            self.processes = isinstance(executor,
+                                        concurrent.futures.ProcessPoolExecutor)
+        else:
+            raise ValueError    # Unknown executor
+        self.executor = executor
+        self.workers = workers
+
+        self.queues = {}        # The request queue for each operation
+        self.dispatchers = []   # The tasks taking requests off them
+        self.closed = False
+
+        # Statistics
+        self.requests = 0       # Requests we've finished
+        self.batches = 0        # Batches we've run
+        self.waiting = 0        # Callers waiting for room in a queue
+
+    def set_private_key(self, private_key, public_key=None):
+        # Use the private key private_key from now on; that is either an
+        # NTRU_privatekey, or a packed private key (see pack_private_key).
+        # Operations already running finish with the old key
+        if not isinstance(private_key, NTRU_privatekey):
+            ntru = NTRU_privatekey(self.parameter_set, **self.options)
+            ntru.unpack_private_key(private_key, 0, public_key)
+            private_key = ntru
+        if public_key is None and getattr(private_key, 'H', None) is not None:
+            public_key = bytes(private_key.pack_Rq0(private_key.H))
+        self.packed_key = bytes(private_key.pack_private_key())
+        self.public_key = public_key
+        self.ntru = private_key
+
+    #
+    # The operations
+    async def key_gen(self):
+        # Generate a new private key (in the executor), start using it, and
+        # return its public key
+        private_key, public_key = await self.submit('key_gen', None)
+        self.set_private_key(private_key, public_key)
+        return public_key
+
+    async def kem_encapsulate(self, public_key):
+        # Returns the ciphertext and the shared secret, as
+        # NTRU_publickey.kem_encapsulate does
+        return await self.submit('kem_encapsulate', bytes(public_key))
+
+    async def kem_decapsulate(self, C_packed):
+        return await self.submit('kem_decapsulate', bytes(C_packed))
+
+    #
+    # The machinery
+    async def submit(self, operation, argument):
+        # Queue a request, and wait for its result
+        if self.closed:
+            raise RuntimeError('NTRU_async is closed')
+        queue = self.queues.get(operation)
+        if queue is None:
+            queue = self.start(operation)
+        future = asyncio.get_running_loop().create_future()
+        if queue.full():
+            self.waiting = self.waiting + 1
+            try:
+                await queue.put((argument, future))
+            finally:
+                self.waiting = self.waiting - 1
+        else:
+            queue.put_nowait((argument, future))
+        return await future
+
+    def start(self, operation):
+        # Create the queue for operation, and its dispatchers (we do this
+        # when the first request comes in, as that's when we know we have a
+        # running event loop)
+        queue = asyncio.Queue(self.queue_size)
+        self.queues[operation] = queue
+        for _ in range(self.workers):
+            self.dispatchers.append(asyncio.ensure_future(
+                                        self.dispatch(operation, queue)))
+        return queue
+
+    async def dispatch(self, operation, queue):
+        # Take batches of requests off queue, and run them in the executor
+        loop = asyncio.get_running_loop()
+        limit = 1 if operation == 'key_gen' else self.max_batch
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < limit and not queue.empty():
+                batch.append(queue.get_nowait())
+            arguments = [argument for argument, _ in batch]
+            try:
+                if operation == 'key_gen':
+                    job = (generate_keypair, self.parameter_set,
+                           self.options)
+                elif self.processes:
+                    job = (run_batch_in_worker, self.parameter_set,
+                           self.options, self.packed_key, operation,
+                           arguments)
+                else:
+                    job = (run_batch, self.ntru, operation, arguments)
+                results = await loop.run_in_executor(self.executor, *job)
+                if operation == 'key_gen':
+                    results = [results]
+            except asyncio.CancelledError:
+                for _, future in batch:
+                    future.cancel()
+                raise
+            except Exception as error:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+            else:
+                for (_, future), result in zip(batch, results):
+                    if not future.done():   # (the caller may have given up)
+                        future.set_result(result)
+            self.batches = self.batches + 1
+            self.requests = self.requests + len(batch)
+
+    def stats(self):
+        # Return a snapshot of how we're doing
+        return {
+            'queued': {operation: queue.qsize()
+                       for operation, queue in self.queues.items()},
+            'waiting': self.waiting,
+            'requests': self.requests,
+            'batches': self.batches,
+        }
+
+    async def close(self):
+        # Stop the dispatchers (failing any requests still queued), and shut
+        # down the executor if we started it
+        self.closed = True
+        for task in self.dispatchers:
+            task.cancel()
+        await asyncio.gather(*self.dispatchers, return_exceptions=True)
+        for queue in self.queues.values():
+            while not queue.empty():
+                _, future = queue.get_nowait()
+                future.cancel()
+        if self.own_executor:
+            # (waiting for whatever is still running, without holding up
+            # the event loop)
+            await asyncio.to_thread(self.executor.shutdown)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exception):
+        await self.close()
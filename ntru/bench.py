@@ -0,0 +1,390 @@
+#
+# Measuring how fast this package is
+import os         # To find where this package is
+import re         # To pick the test vectors out of the draft
+import sys        # To find the Python we're running under
+import json       # To read and write benchmark results
+import time       # To time things
+import platform   # To record which machine the results came from
+import argparse   # For the command line ('python -m ntru.bench')
+import subprocess # To time importing the package in a fresh interpreter
+import compileall # To compile the package before we time importing it
+import tracemalloc      # To measure how much memory each operation allocates
+from .core import NTRU_privatekey, parameter_sets, load_numpy
+from .multiply import multiply_backends
+from .rng import NTRU_shake_drbg
+
+def benchmark_table(sets=None, seconds=1.0, **options):
+    # Measure how many key generations, encapsulations and decapsulations
+    # per second we can do for each parameter set, and return the results
+    # as a table (a string).  Each operation is repeated for about 'seconds'
+    # seconds.  Any extra keyword arguments are passed to NTRU_privatekey
+    # (for example, multiply_backend or arithmetic)
+    def rate(operation):
+        count = 0
+        start = time.perf_counter()
+        while True:
+            operation()
+            count = count + 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= seconds:
+                return count / elapsed
+
+    lines = ['%-12s %5s %6s %10s %10s %10s' %
+             ('set', 'n', 'q', 'keygen/s', 'encaps/s', 'decaps/s')]
+    for parameter_set in sets or parameter_sets:
+        private_key = NTRU_privatekey(parameter_set, **options)
+        public_key = private_key.key_gen()
+        ciphertext, _ = private_key.kem_encapsulate(public_key)
+        keygen = rate(private_key.key_gen)
+        # (key_gen replaced the private key; encapsulate to the new one)
+        public_key = private_key.pack_Rq0(private_key.H)
+        encaps = rate(lambda: private_key.kem_encapsulate(public_key))
+        ciphertext, _ = private_key.kem_encapsulate(public_key)
+        decaps = rate(lambda: private_key.kem_decapsulate(ciphertext))
+        lines.append('%-12s %5d %6d %10.1f %10.1f %10.1f' %
+                     (parameter_set, private_key.n, private_key.q,
+                      keygen, encaps, decaps))
+    return '\n'.join(lines)
+
+#
+# How long 'import ntru' may take, in seconds.  Importing the package doesn't
+# do any NTRU operations, or build any tables, or import NumPy or
+# multiprocessing (those all happen the first time they are needed); what's
+# left measures at around 9 msec (with the bytecode already compiled), most
+# of which is hashlib and threading.  This leaves room for a slower machine
+# run_benchmarks measures it, and compare_benchmarks reports it as a
+# regression if it goes over
+import_time_budget = 0.025
+
+def measure_import_time(repeat=5):
+    # Measure how long 'import ntru' takes, in seconds.  This has to be done
+    # in a fresh interpreter (in this one, the package has already been
+    # imported); we do it 'repeat' times, and return the fastest, as the
+    # others mostly measure how busy the machine was
+    script = ('import time; start = time.perf_counter(); import ntru; '
+              'print(time.perf_counter() - start)')
+    # (we run it from the directory that holds this package, so that it
+    # imports this copy)
+    directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    # We're timing the import, not the compiler; so make sure the bytecode
+    # is there first (it won't be if, say, PYTHONDONTWRITEBYTECODE is set)
+    compileall.compile_dir(os.path.dirname(os.path.abspath(__file__)),
+                           quiet=1)
+    best = None
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', script],
+                                capture_output=True, check=True,
+                                text=True, cwd=directory).stdout
+        elapsed = float(output)
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+#
+# The benchmark suite.  This times each of the KEM operations, and the
+# primitives they are built from, for each parameter set, under each of the
+# arithmetic configurations (each multiply backend with the 'list'
+# arithmetic, and the 'numpy' arithmetic if NumPy is installed).  For each
+# one, it reports operations per second, the median (p50) and 99th
+# percentile (p99) time of a single call, and the peak memory one call
+# allocates
+#
+# Being fast isn't worth much if the answers are wrong; so, before timing a
+# configuration, we run it against the draft's test vectors (for the
+# parameter sets the draft has them for), and record whether it passed
+
+def configurations():
+    # Return the arithmetic configurations we can benchmark here, as a dict
+    # from a name to the NTRU_base options that select it
+    configs = {}
+    for backend in multiply_backends:
+        configs[backend] = {'multiply_backend': backend}
+    try:
+        load_numpy()
+        configs['numpy'] = {'arithmetic': 'numpy'}
+    except ImportError:
+        pass
+    return configs
+
+def benchmark_operations(ntru):
+    # Return the operations we time, as a dict from a name to a function
+    # that does one of them (on inputs we set up here, so that setting up
+    # isn't part of what we time).  ntru is the NTRU_privatekey to use; this
+    # runs key_gen on it
+    public_key = ntru.key_gen()
+    ciphertext, _ = ntru.kem_encapsulate(public_key)
+    A = ntru.unpack_Rq0(public_key)
+    B = ntru.multiply_int(ntru.sample_fixed_type(), 3)
+    F = ntru.sample_iid()
+    FG = ntru.multiply(F, B)
+    return {
+        'key_gen': ntru.key_gen,
+        'kem_encapsulate': lambda: ntru.kem_encapsulate(public_key),
+        'kem_decapsulate': lambda: ntru.kem_decapsulate(ciphertext),
+        'multiply': lambda: ntru.multiply(A, B),
+        'multiply_3': lambda: ntru.multiply_3(F, B),
+        'invert': lambda: ntru.invert(FG),
+        'invert_3': lambda: ntru.invert_3(F),
+        'pack_Rq0': lambda: ntru.pack_Rq0(A),
+        'unpack_Rq0': lambda: ntru.unpack_Rq0(public_key),
+        'sample_fixed_type': ntru.sample_fixed_type,
+    }
+
+def percentile(times, fraction):
+    # Return the value that 'fraction' of the (sorted) list times are no
+    # larger than (the 'nearest rank' percentile)
+    index = max(0, -(-len(times) * fraction // 1) - 1)
+    return times[int(index)]
+
+def measure(operation, seconds, min_runs=3):
+    # Time the function operation, calling it repeatedly for about 'seconds'
+    # seconds (but at least min_runs times), and return a dict with what
+    # we found
+    times = []
+    total = 0
+    while total < seconds or len(times) < min_runs:
+        start = time.perf_counter()
+        operation()
+        elapsed = time.perf_counter() - start
+        times.append(elapsed)
+        total = total + elapsed
+    times.sort()
+
+    # And, separately (tracing allocations slows everything down, so we
+    # don't do it while timing), find how much memory one call needs
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    operation()
+    _, peak = tracemalloc.get_traced_memory()
+    if not tracing:
+        tracemalloc.stop()
+
+    return {
+        'runs': len(times),
+        'ops_per_sec': len(times) / total,
+        'p50_ms': 1000 * percentile(times, 0.50),
+        'p99_ms': 1000 * percentile(times, 0.99),
+        'peak_alloc_bytes': peak - before,
+    }
+
+def draft_path():
+    # Where the draft (and so the test vectors) is; it is kept next to this
+    # package
+    directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(directory, 'draft-fluhrer-cfrg-ntru.md')
+
+def load_test_vectors(path=None):
+    # Read the test vectors out of the draft, and return them as a dict from
+    # the parameter set name to a list of tests; each test is a dict from
+    # the name the draft gives each value (such as 'PUBLIC KEY') to the
+    # value (as bytes)
+    with open(path or draft_path()) as file:
+        text = file.read()
+    vectors = {}
+    sections = re.split(r'^## Test Vectors for ntru', text, flags=re.M)
+    for section in sections[1:]:
+        name, section = section.split('\n', 1)
+        section = section.split('\n# ')[0]    # Stop at the next top heading
+        tests = vectors.setdefault(name.strip(), [])
+        for test in section.split('---TEST')[1:]:
+            fields = {}
+            field = None
+            for line in test.split('\n'):
+                if line.startswith('    ') and field is not None:
+                    fields[field] += line.strip()
+                elif line.strip().endswith(':'):
+                    field = line.strip()[:-1]
+                    fields[field] = ''
+            tests.append({k: bytes.fromhex(v) for k, v in fields.items()})
+    return vectors
+
+def check_test_vectors(parameter_set, options, vectors):
+    # Check the configuration 'options' against the test vectors for
+    # parameter_set (vectors is what load_test_vectors returns).  Returns
+    # True if every test passed, False if any failed, and None if there are
+    # no test vectors for this parameter set
+    if not vectors.get(parameter_set):
+        return None
+    ntru = NTRU_privatekey(parameter_set, **options)
+    n = ntru.n
+    for test in vectors[parameter_set]:
+        # The private key is pack_S3(F) || pack_S3(F_inv) || pack_Sq(H_inv)
+        # || S; pack_Sq is pack_Rq0, for a polynomial whose last
+        # coefficient is 0
+        private_key = test['PRIVATE KEY']
+        S3_bytes = ntru.packed_S3_bytes
+        ntru.F = ntru.unpack_S3(private_key, 0)
+        F_inv = ntru.unpack_S3(private_key, S3_bytes)
+        ntru.F_inv = F_inv
+        ntru.H_inv = ntru.unpack_Rq0(private_key, 2*S3_bytes)
+        ntru.H_inv[n-1] = 0
+        ntru.S = bytearray(private_key[-32:])
+        ntru.H = ntru.unpack_Rq0(test['PUBLIC KEY'])
+        R = ntru.unpack_S3(test['R~shared,3~'])
+        M = ntru.unpack_S3(test['M~shared,3~'])
+
+        # The KEM operations
+        if bytes(ntru.kem_decapsulate(test['CIPHER TEXT'])) != \
+                                             test['SECRET STRING']:
+            return False
+        if bytes(ntru.encrypt(test['PUBLIC KEY'], R, M)) != \
+                                             test['CIPHER TEXT']:
+            return False
+        if bytes(ntru.pack_Rq0(ntru.H)) != test['PUBLIC KEY']:
+            return False
+
+        # And the inversions (which decapsulation doesn't use); the inverse
+        # is only defined mod (x^n-1)/(x-1), so that's how we compare them
+        if ntru.as_list(ntru.mod_phin_3(ntru.invert_3(ntru.F))) != \
+                                   ntru.as_list(ntru.mod_phin_3(F_inv)):
+            return False
+        if ntru.as_list(ntru.mod_phin(ntru.invert(ntru.H))) != \
+                                   ntru.as_list(ntru.H_inv):
+            return False
+    return True
+
+def run_benchmarks(sets=None, configs=None, seconds=0.25, vectors=None,
+                   seed=None):
+    # Run the benchmark suite, and return the results (as a dict, ready to
+    # be written as JSON).  sets is the list of parameter sets (default: all
+    # of them), configs the list of configuration names (default: all of
+    # those in configurations()), seconds how long to spend timing each
+    # operation, and vectors the test vectors (default: those in the draft)
+    # If seed is given, each configuration gets its random bytes from an
+    # NTRU_shake_drbg seeded with it, so that every run works on the same
+    # keys and ciphertexts
+    # We also measure how long 'import ntru' takes (see import_time_budget)
+    available = configurations()
+    if vectors is None:
+        vectors = load_test_vectors()
+    results = []
+    for parameter_set in sets or parameter_sets:
+        for config in configs or available:
+            if config not in available:
+                raise ValueError    # Unknown (or unavailable) configuration
+            options = available[config]
+            result = {
+                'parameter_set': parameter_set,
+                'configuration': config,
+                'test_vectors': check_test_vectors(parameter_set, options,
+                                                   vectors),
+                'operations': {},
+            }
+            if seed is not None:
+                options = dict(options, rng=NTRU_shake_drbg(seed))
+            ntru = NTRU_privatekey(parameter_set, **options)
+            for name, operation in benchmark_operations(ntru).items():
+                result['operations'][name] = measure(operation, seconds)
+            results.append(result)
+    numpy = sys.modules.get('numpy')
+    return {
+        'python': platform.python_version(),
+        'numpy': numpy.__version__ if numpy else None,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'import_time': measure_import_time(),
+        'results': results,
+    }
+
+def compare_benchmarks(results, baseline, tolerance=0.25):
+    # Compare the results of run_benchmarks against an earlier run (the
+    # baseline), and return a list of the regressions we find (as strings;
+    # an empty list means there weren't any).  Something regressed if it
+    # does fewer operations per second than the baseline, by more than
+    # 'tolerance' (a fraction), or if it doesn't pass the test vectors (and
+    # either it failed them, or the baseline passed them); and if importing
+    # the package took longer than import_time_budget
+    regressions = []
+    import_time = results.get('import_time')
+    if import_time is not None and import_time > import_time_budget:
+        regressions.append('import ntru: %.1f msec, over the budget of '
+                           '%.1f msec' % (1000 * import_time,
+                                          1000 * import_time_budget))
+    previous = {}
+    for result in baseline['results']:
+        key = (result['parameter_set'], result['configuration'])
+        previous[key] = result
+    for result in results['results']:
+        key = (result['parameter_set'], result['configuration'])
+        name = '%s/%s' % key
+        old = previous.get(key)
+        if result['test_vectors'] is False or (old is not None and
+                                              old['test_vectors'] and
+                                              not result['test_vectors']):
+            regressions.append('%s: fails the test vectors' % name)
+        if old is None:
+            continue
+        for operation, stats in result['operations'].items():
+            if operation not in old['operations']:
+                continue
+            was = old['operations'][operation]['ops_per_sec']
+            now = stats['ops_per_sec']
+            if now < was * (1 - tolerance):
+                regressions.append('%s %s: %.1f ops/sec, was %.1f' %
+                                   (name, operation, now, was))
+    return regressions
+
+def format_benchmarks(results):
+    # Format the results of run_benchmarks as a table (a string)
+    lines = ['%-12s %-10s %-18s %5s %11s %9s %9s %11s' %
+             ('set', 'config', 'operation', 'kat', 'ops/s', 'p50 ms',
+              'p99 ms', 'peak bytes')]
+    kat_names = {True: 'ok', False: 'FAIL', None: '-'}
+    for result in results['results']:
+        kat = kat_names[result['test_vectors']]
+        for operation, stats in result['operations'].items():
+            lines.append('%-12s %-10s %-18s %5s %11.1f %9.3f %9.3f %11d' %
+                         (result['parameter_set'], result['configuration'],
+                          operation, kat, stats['ops_per_sec'],
+                          stats['p50_ms'], stats['p99_ms'],
+                          stats['peak_alloc_bytes']))
+    if results.get('import_time') is not None:
+        lines.append('import ntru: %.1f msec (budget %.1f msec)' %
+                     (1000 * results['import_time'],
+                      1000 * import_time_budget))
+    return '\n'.join(lines)
+
+def main(argv=None):
+    # Run the benchmark suite from the command line; the exit status is 1 if
+    # anything regressed against the baseline (or failed the test vectors,
+    # or the import time budget)
+    parser = argparse.ArgumentParser(prog='python -m ntru.bench',
+                                     description='NTRU benchmark suite')
+    parser.add_argument('--set', action='append', dest='sets',
+                        help='parameter set to run (default: all)')
+    parser.add_argument('--config', action='append', dest='configs',
+                        help='configuration to run (default: all of %s)' %
+                             ', '.join(configurations()))
+    parser.add_argument('--seconds', type=float, default=0.25,
+                        help='time to spend on each operation')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline',
+                        help='compare against results saved with --json')
+    parser.add_argument('--seed', type=lambda s: s.encode(),
+                        help='seed the random choices, to make runs '
+                             'repeatable')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='slowdown (as a fraction) to report')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sets, args.configs, args.seconds,
+                             seed=args.seed)
+    print(format_benchmarks(results))
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=1)
+    baseline = {'results': []}
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    regressions = compare_benchmarks(results, baseline, args.tolerance)
+    for regression in regressions:
+        print('REGRESSION:', regression)
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,1940 @@
+#
+# This is an example NTRU implementation; a simple example of the key
+# exchange is in __main__.py (run it with 'python -m ntru').
+# This is *only* example code, and should be used only to gain an
+# understanding of how NTRU works; it should *not* be used by any real
+# application:
+# - By default, it gets its randomness from os.urandom, which is fine; but
+#   it also lets you replace that with a seeded (and so predictable) DRBG
+# - NTRU needs to be done in constant time (or, at least, time independent of
+#   any secret data.  While we make some attempts to do that (and added
+#   comments where constant-time code is less clear), Python itself doesn't
+#   claim to be constant time
+# And, of course, there's the practical issue that this implementation is
+# bog slow
+#
+# We tried to comment this code fairly well, after all, the whole point is
+# to show how NTRU works internally.  If it feels like I've overexplained
+# things, well, it's better than underexplaining things
+#
+# Internally, it uses a balanced representation to store polynomial
+# coefficients; when the NTRU spec talks about values between 0 and Q-1, we
+# actually store values between -Q/2 and Q/2-1.  Similarly, instead of storing
+# values between 0 and 2, we store values between -1 and 1.  This simplifies
+# some of the logic
+
+import struct     # To split random bytes into 16 and 32 bit values
+import hashlib    # To get SHA-3
+import threading  # To share the public key cache between threads
+import collections      # For the public key cache
+import copy       # To make new private key objects like an existing one
+from .multiply import (multiply_backends, NTRU_prepared_polynomial,
+                       default_multiply_backend, kronecker_pack,
+                       kronecker_unpack, kronecker_resize, ternary_kernel,
+                       is_ternary)
+from .poly import NTRU_polynomial
+from .rng import NTRU_system_random
+from .sorting import sort_network_list, sort_network_numpy
+
+#
+# NumPy is optional (it is used only by the 'numpy' arithmetic), and takes
+# longer to import than the rest of this package put together; so we only
+# import it the first time someone asks for the numpy arithmetic
+numpy = None
+
+def load_numpy():
+    # Import NumPy, if we haven't already; this raises ImportError if it
+    # isn't installed
+    global numpy
+    if numpy is None:
+        import numpy as numpy_module
+        numpy = numpy_module
+    return numpy
+
+def mod3(x):
+    # This converts:
+    #  Numbers 0 mod 3 (..., -6, -3, 0, 3, 6, ...) -> 0
+    #  Numbers 1 mod 3 (..., -5, -2, 1, 4, 7, ...) -> 1
+    #  Numbers 2 mod 3 (..., -4, -1, 2, 5, 8, ...) -> -1
+    # This relies on python getting negative modulii correct; -1 % 3 = 2
+    # Other languages may need more complicated approaches
+    # This also assumes that the % operator is constant time; this is unlikely
+    # to be true
+    return ((x+1) % 3) - 1
+
+def add_3_bits(AP, AM, BP, BM):
+    # Add two polynomials mod 3, where each polynomial is held as a pair of
+    # integers: bit x of P is set if coefficient x is 1, and bit x of M is
+    # set if coefficient x is -1.  A coefficient of the sum is 1 if the two
+    # coefficients were 1 and 0 (either way around), or -1 and -1; it is -1
+    # if they were -1 and 0, or 1 and 1
+    AZ = ~(AP | AM)       # The bits where A is 0
+    BZ = ~(BP | BM)       # The bits where B is 0
+    SP = (AP & BZ) | (BP & AZ) | (AM & BM)
+    SM = (AM & BZ) | (BM & AZ) | (AP & BP)
+    return SP, SM
+
+def hash_two_strings(S, C):
+    # This SHA3-256 hashes the concatination of two strings
+    hash = hashlib.sha3_256()
+    hash.update( S )
+    hash.update( C )
+    return hash.digest()
+
+#
+# hash_two_trinary_polynomials packs the two polynomials it hashes into a
+# buffer that it reuses from one call to the next, rather than building two
+# new byte strings each time.  Each thread has its own (so that threads
+# sharing an NTRU object don't pack into the same one)
+hash_buffers = threading.local()
+
+def hash_buffer(size):
+    # Return this thread's buffer, of size bytes
+    buffer = getattr(hash_buffers, 'buffer', None)
+    if buffer is None or len(buffer) != size:
+        buffer = bytearray(size)
+        hash_buffers.buffer = buffer
+    return buffer
+       
+#
+# The circulant index matrices used by the numpy arithmetic, by n (see
+# NTRU_base.convolve_numpy).  These are only built the first time they are
+# needed
+circulant_indices = {}
+
+def circulant_index(n):
+    # Return the n by n matrix I with I[x][z] = (z - x) mod n.  If we index B
+    # with it, we get the matrix whose row x is B rotated by x places; and so
+    # multiplying the row vector A by that matrix gives, for each z, the sum
+    # of A[x]*B[z-x], which is the product of A and B modulo x^n-1
+    if n not in circulant_indices:
+        x = numpy.arange(n)
+        circulant_indices[n] = (x[None, :] - x[:, None]) % n
+    return circulant_indices[n]
+
+class NTRU_base:
+    #
+    # This is the low level code that deals with NTRU operations
+    # It is initialized with the NTRU parameter set we will be using
+    # This parameter set is summarized by the variables:
+    #  - n, the size of the polynomial
+    #  - q, the modulus of the elements in the polynomail
+    #  - hrss, which is True for the NTRU-HRSS parameter sets, and False for
+    #    the NTRU-HPS ones.  HRSS differs from HPS in how it selects F, G and
+    #    M, and it 'lifts' M before adding it into the ciphertext
+
+    def __init__(self, parameter_set, multiply_backend=None,
+                 arithmetic='list', inversion=None, rng=None, sort=None,
+                 ternary=True):
+        # Initialize ourselves to do the specified parameter set
+        # multiply_backend selects how we multiply polynomials (one of the
+        # names in multiply_backends); by default, we pick one based on the
+        # parameter set
+        # arithmetic selects how we store polynomials:
+        #  - 'list' stores them as Python lists of integers (one element at a
+        #    time; this is the easiest to follow)
+        #  - 'numpy' stores them as fixed width NumPy arrays, and does each
+        #    polynomial operation as a single vectorized step.  This gives
+        #    bit-for-bit the same results as 'list'
+        # inversion selects how invert and invert_3 do their inner loops,
+        # either 'list' or 'bits' (see inversion_2_list); by default, 'list'
+        # for tiny polynomials, and 'bits' otherwise
+        # rng is where we get our random bytes from (see rng.py); by
+        # default, the operating system's CSPRNG.  Pass a seeded DRBG (such
+        # as NTRU_shake_drbg) to make our random choices repeatable
+        # sort selects how sample_fixed_type sorts, either 'network' (a
+        # sorting network, which does the same steps whatever the values;
+        # see sorting.py) or 'builtin' (Python's or NumPy's own sort, which
+        # doesn't); by default, 'network' for the numpy arithmetic and
+        # 'builtin' otherwise (the list version of the network is the
+        # slower by a couple of milliseconds)
+        # ternary selects whether multiply and multiply_3 hand products
+        # where one operand is ternary to the backend's ternary kernel (see
+        # ternary_kernel); that gives the same results, faster.  The numpy
+        # arithmetic doesn't have ternary kernels
+        self.parameter_set = parameter_set
+        self.hrss = False
+        if parameter_set == 'hps2048509':
+            self.n = 509
+            self.q = 2048
+        elif parameter_set == 'hps2048677':
+            self.n = 677
+            self.q = 2048
+        elif parameter_set == 'hps4096821':
+            self.n = 821
+            self.q = 4096
+        elif parameter_set == 'hps40961229':
+            self.n = 1229
+            self.q = 4096
+        elif parameter_set == 'hrss701':
+            self.n = 701
+            self.q = 8192
+            self.hrss = True
+        elif parameter_set == 'hrss1373':
+            self.n = 1373
+            self.q = 16384
+            self.hrss = True
+        elif parameter_set == 'tiny':    # For testing purposes only
+            self.n = 17
+            self.q = 128
+        else:
+            raise ValueError    # Undefined parameter set
+
+        if multiply_backend is None:
+            multiply_backend = default_multiply_backend(self.n)
+        if multiply_backend not in multiply_backends:
+            raise ValueError    # Undefined multiplication backend
+        self.multiply_backend = multiply_backend
+        self.convolve = multiply_backends[multiply_backend]
+
+        if arithmetic == 'numpy':
+            try:
+                load_numpy()
+            except ImportError:
+                raise ImportError('the numpy arithmetic requires numpy')
+            self.use_numpy = True
+            self.multiply_backend = 'numpy'
+        elif arithmetic == 'list':
+            self.use_numpy = False
+        else:
+            raise ValueError    # Undefined arithmetic
+        self.logq = self.q.bit_length() - 1   # q == 2**logq
+
+        if inversion is None:
+            inversion = 'list' if self.n < 64 else 'bits'
+        if inversion not in ('list', 'bits'):
+            raise ValueError    # Undefined inversion method
+        self.inversion = inversion
+        self.rng = rng if rng is not None else NTRU_system_random()
+        if sort is None:
+            sort = 'network' if self.use_numpy else 'builtin'
+        if sort not in ('network', 'builtin'):
+            raise ValueError    # Undefined sort method
+        self.sort = sort
+        self.ternary = ternary
+ 
+    def modq(self, x):
+        # This converts x into x mod q, where x mod q is in balanced
+        # representation, that is, within the interval [-q/2, ..., q/2)
+        # Actually, if your implementation computes integers mod 2**16 or 2**32
+        # internally, you could get away without this; just ignore the bits
+        # above 11 (q=2048) or 12 (q=4096), and mask them at the end.
+        # However, because python will use bignum's, we have to keep things
+        # small ourselves.
+        return ((x+self.q//2) % self.q) - self.q//2
+
+    #
+    # When this object is copied (as key_gen_many does) or pickled, the copy
+    # gets the class's own methods: anything set on this object in place of
+    # one of them (as NTRU_instrumentation does; see instrument.py) is tied
+    # to this object, and so isn't sent along
+    def __getstate__(self):
+        cls = type(self)
+        return {name: value for name, value in self.__dict__.items()
+                if not callable(getattr(cls, name, None))}
+
+    #
+    # Helpers for the numpy arithmetic
+    # Polynomials are stored as int16 arrays (every value we keep fits; the
+    # largest q is 2**14 (hrss1373), and we store values between -q/2 and
+    # q/2-1); we
+    # widen them to int64 while computing so that nothing can overflow
+    def wide(self, A):
+        return numpy.asarray(A, dtype=numpy.int64)
+
+    def narrow(self, A):
+        return A.astype(numpy.int16)
+
+    def polynomial(self, A, modulus=None):
+        # Convert a polynomial (mod modulus, by default q) to the compact
+        # form we keep polynomials we hold on to in: an NTRU_polynomial
+        # (see poly.py) for the list arithmetic; the numpy arithmetic's
+        # int16 arrays are already compact
+        if self.use_numpy:
+            return self.narrow(self.wide(A))
+        return NTRU_polynomial(A, modulus or self.q)
+
+    def as_list(self, A):
+        # Convert a polynomial to a Python list (for the code that steps
+        # through it one coefficient at a time); a list is returned as it is
+        if self.use_numpy:
+            return self.wide(A).tolist()
+        if type(A) is not list:
+            return list(A)      # (an NTRU_polynomial)
+        return A
+
+    def convolve_numpy(self, A, B, reduce):
+        # Multiply two polynomials modulo x^n-1 (without reducing the
+        # coefficients of the result).  Either A or B (or both) may also be
+        # a matrix whose rows are polynomials (a 'batch'); in that case, we
+        # multiply each row, and return a matrix.  reduce is the function
+        # (modq or mod3) that the caller will apply to the result
+        A = self.wide(A)
+        B = self.wide(B)
+        if A.ndim == 1 and B.ndim == 1:
+            # numpy.convolve slides B past A and gives the full 2n-1
+            # coefficient product; we then fold the coefficients of x^n and
+            # above back down onto x^0 and above
+            Full = numpy.convolve(A, B)
+            Product = Full[:self.n].copy()
+            Product[:self.n-1] += Full[self.n:]
+            return Product
+        if A.ndim == 1:
+            A, B = B, A     # Multiplication commutes; put the batch in A
+        if B.ndim == 1:
+            # Every row is multiplied by the same polynomial B; that's a
+            # single matrix product with the circulant matrix of B (see
+            # circulant_index).  We do that in floating point (which lets
+            # numpy hand it to BLAS); that is exact, because once we reduce
+            # the inputs, every sum is at most n*(q/2)^2 < 2^37, well within
+            # the 53 bits of a double
+            A = reduce(A).astype(numpy.float64)
+            B = reduce(B)[circulant_index(self.n)].astype(numpy.float64)
+            return numpy.rint(A @ B).astype(numpy.int64)
+        # Every row of A is multiplied by a different row of B.  For each
+        # row, we want the same matrix as above; we get it without copying
+        # anything by taking sliding windows over the row of B reversed (and
+        # written out twice, so that the windows can wrap around)
+        D = numpy.roll(B[:, ::-1], 1, axis=1)       # D[j] = B[-j mod n]
+        D = numpy.concatenate((D, D), axis=1)
+        W = numpy.lib.stride_tricks.sliding_window_view(D, self.n, axis=1)
+        W = W[:, self.n:0:-1, :]                   # W[z][x] = B[z-x mod n]
+        return numpy.einsum('bx,bzx->bz', A, W)
+
+    def add(self, A, B):
+        # Add two polynomials (mod q)
+        if self.use_numpy:
+            return self.narrow(self.modq(self.wide(A) + self.wide(B)))
+        Sum = []
+        for x in range(self.n):
+            Sum.append( self.modq(A[x] + B[x]) )
+        return Sum
+
+    def subtract(self, A, B):
+        # Subtract two polynomials (mod q)
+        if self.use_numpy:
+            return self.narrow(self.modq(self.wide(A) - self.wide(B)))
+        Sum = []
+        for x in range(self.n):
+            Sum.append( self.modq(A[x] - B[x]) )
+        return Sum
+
+    def multiply(self, A, B):
+        # Multiply two polynomials (mod q)
+        # The actual multiplication is done by whichever backend we
+        # selected; see convolve_schoolbook for the obvious way of doing it
+        # B may be an NTRU_prepared_polynomial (see prepare)
+        if self.use_numpy:
+            if isinstance(B, NTRU_prepared_polynomial):
+                B = B.operand(self, self.q)
+            return self.narrow(self.modq(self.convolve_numpy(A, B,
+                                                             self.modq)))
+        Product = self.convolve_list(A, B, self.q)
+        for x in range(self.n):
+            Product[x] = self.modq( Product[x] )
+        return Product
+
+    def multiply_3(self, A, B):
+        # Multiply two polynomials (mod 3)
+        if self.use_numpy:
+            if isinstance(B, NTRU_prepared_polynomial):
+                B = B.operand(self, 3)
+            return self.narrow(mod3(self.convolve_numpy(A, B, mod3)))
+        Product = self.convolve_list(A, B, 3)
+        for x in range(self.n):
+            Product[x] = mod3( Product[x] )
+        return Product
+
+    def convolve_list(self, A, B, modulus):
+        # Multiply two polynomials (lists; B may be prepared) modulo x^n-1,
+        # with our backend, without reducing the result.  If either one is
+        # ternary, we use the backend's ternary kernel instead
+        kernel = None
+        if self.ternary:
+            kernel = ternary_kernel(self.multiply_backend, self.n, modulus)
+        if kernel is not None:
+            if is_ternary(B):
+                return kernel(A, self.ternary_operand(B, modulus), self.n,
+                              modulus)
+            if is_ternary(A):
+                return kernel(self.ternary_operand(B, modulus), A, self.n,
+                              modulus)
+        if isinstance(B, NTRU_prepared_polynomial):
+            B = B.operand(self, modulus)
+        return self.convolve(A, B, self.n, modulus)
+
+    def ternary_operand(self, B, modulus):
+        # What to pass the ternary kernel for B
+        if isinstance(B, NTRU_prepared_polynomial):
+            return B.ternary_operand(self, modulus)
+        return B
+
+    def prepare(self, B, modulus=None):
+        # We are going to multiply by the polynomial B many times (mod
+        # modulus, which defaults to q); return it in the form that makes
+        # that cheapest for our multiplication backend
+        return NTRU_prepared_polynomial(self, B, modulus or self.q)
+
+    def mod_phin(self, A):
+        # Take the polynomial A (which is on degree n) and reduce it
+        # mod x^n + x^(n-1) + ... + 1
+        # That is, we return the n-1 degree polynomial
+        # A - k(x^n + x^(n-1) + ... + 1) for the value k that makes this
+        # of that degree
+        if self.use_numpy:
+            # (A may also be a batch; this works on each row)
+            B = self.wide(A)
+            B = self.modq(B - B[..., self.n-1:])
+            B[..., self.n-1] = 0
+            return self.narrow(B)
+        B = A
+        msdigit = B[ self.n-1 ]    # msdigit == k
+        for x in range(self.n-1):
+            B[x] = self.modq(B[x] - msdigit)
+        B[ self.n-1 ] = 0
+        return B
+
+    def mod_phin_3(self, A):
+        # The same as mod_phin, but for polynomials mod 3
+        if self.use_numpy:
+            B = self.wide(A)
+            return self.narrow(mod3(B - B[..., self.n-1:]))
+        B = []
+        for x in range(self.n):
+            B.append( mod3(A[x] - A[self.n-1]) )
+        return B
+
+    def multiply_phi1(self, A):
+        # Multiply the polynomial A by x-1 (mod q); the coefficient of x^i in
+        # the product is A[i-1] - A[i] (with A[-1] being A[n-1], because
+        # we're working modulo x^n-1)
+        if self.use_numpy:
+            A = self.wide(A)
+            return self.narrow(self.modq(numpy.roll(A, 1, axis=-1) - A))
+        Product = []
+        for x in range(self.n):
+            Product.append( self.modq(A[x-1] - A[x]) )
+        return Product
+
+    def phi1_inverse_3(self):
+        # Return the inverse of x-1, modulo 3 and (x^n-1)/(x-1) (prepared
+        # for multiply_3; we only work this out the first time we need it)
+        # We don't need the general purpose invert_3 for this; it's
+        #   1/n * (x + 2x^2 + 3x^3 + ... + (n-1)x^(n-1))
+        # You can check this by multiplying by x-1; the coefficient of x^0
+        # is (n-1)/n, and of every other power is -1/n; that is, the
+        # product is 1 - 1/n * (1 + x + ... + x^(n-1)), which is 1 modulo
+        # (x^n-1)/(x-1).  And, mod 3, 1/n is just n (as n isn't a multiple
+        # of 3, n*n = 1 mod 3)
+        if getattr(self, 'phi1_inv_3', None) is None:
+            B = []
+            for x in range(self.n):
+                B.append( mod3(x * self.n) )
+            self.phi1_inv_3 = self.prepare(B, 3)
+        return self.phi1_inv_3
+
+    def lift(self, M):
+        # Convert the trinary M into the polynomial that the encryptor adds
+        # into the ciphertext
+        # For HPS, that's just M
+        if not self.hrss:
+            return M
+        # For HRSS, it's (x-1) * (M / (x-1)), where the division is done
+        # modulo 3 and (x^n-1)/(x-1).  The result is always a multiple of
+        # x-1 (which, like for HPS, keeps the ciphertext a multiple of x-1),
+        # and is equal to M modulo 3 and (x^n-1)/(x-1)
+        V = self.mod_phin_3(self.multiply_3(M, self.phi1_inverse_3()))
+        return self.multiply_phi1(V)
+
+    def multiply_int(self, A, val):
+        # Multiply the polynomial A by the integer val
+        if self.use_numpy:
+            return self.narrow(self.modq(self.wide(A) * val))
+        Product = []
+        for x in range(self.n):
+            v = self.modq(A[x] * val)
+            Product.append(v)
+        return Product
+
+    #
+    # The inner loops of invert and invert_3; these invert AR modulo 2 (or
+    # 3) and (x^n-1)/(x-1), taking AR as a list, and returning the inverse
+    # as a list
+    # There are two versions of each:
+    #  - The 'list' versions work on lists one coefficient at a time; these
+    #    are the easiest to follow
+    #  - The 'bits' versions pack each polynomial into Python integers, so
+    #    each step of the loop (shifting a polynomial, or adding one
+    #    polynomial to another) is a few whole-integer operations, rather
+    #    than a pass over n list elements.  They compute exactly the same
+    #    thing as the list versions (and they don't change the blinding;
+    #    that's done by invert and invert_3 either way)
+
+    def inversion_2_list(self, AR):
+        V = []
+        for _ in range(self.n):
+            V.append(0)
+        W = [1]
+        for _ in range(self.n-1):
+            W.append(0)
+        F = []
+        for _ in range(self.n):
+            F.append(1)
+        G = []
+        for x in range(self.n-1):
+            G.append( (AR[self.n-2-x] ^ AR[self.n-1]) % 2 )
+        G.append(0)
+        delta = 1
+        for _ in range(2*self.n-3):
+            for x in reversed(range(self.n-1)):
+                V[x] = V[x-1]
+            V[self.n-1] = 0
+            if delta > 0 and G[0] != 0:
+                swap = True
+                delta = -delta
+            else:
+                swap = False
+            delta = delta + 1
+            if swap:
+                F, G = G, F
+                V, W = W, V
+            if F[0] != 0 and G[0] != 0:
+                for x in range(self.n):
+                    G[x] = G[x]^F[x]
+                    W[x] = W[x]^V[x]
+            for x in range(self.n-1):
+                G[x] = G[x+1]
+            G[self.n-1] = 0
+        B = []
+        for x in range(self.n-1):
+            B.append( V[self.n-2-x] )
+        B.append(0)
+        return B
+
+    def inversion_2_bits(self, AR):
+        # Here, bit x of the integer holds coefficient x of the polynomial
+        # (which is 0 or 1, as we're working mod 2)
+        n = self.n
+        V = 0
+        W = 1
+        F = (1 << n) - 1
+        G = 0
+        for x in range(self.n-1):
+            G = G | (((AR[n-2-x] ^ AR[n-1]) % 2) << x)
+        low = (1 << (n-1)) - 2     # The bits 1 through n-2
+        delta = 1
+        for _ in range(2*n-3):
+            # The list version moves V[n-1] down to V[0] (and shifts the
+            # rest up), and then clears V[n-1]
+            V = ((V << 1) & low) | ((V >> (n-1)) & 1)
+            if delta > 0 and G & 1:
+                delta = -delta
+                F, G = G, F
+                V, W = W, V
+            delta = delta + 1
+            if F & G & 1:
+                G = G ^ F       # Adding mod 2 is XOR
+                W = W ^ V
+            G = G >> 1
+        # B[x] is V[n-2-x]; format writes V msbit first, and so its
+        # character x+1 is V[n-2-x]
+        bits = format(V, '0%db' % n)
+        B = [int(bit) for bit in bits[1:n]]
+        B.append(0)
+        return B
+
+    def inversion_3_list(self, AR):
+        V = []
+        for _ in range(self.n):
+            V.append(0)
+        W = [1]
+        for _ in range(self.n-1):
+            W.append(0)
+        F = []
+        for _ in range(self.n):
+            F.append(1)
+        G = []
+        for x in range(self.n-1):
+            G.append( mod3(AR[self.n-2-x] - AR[self.n-1]) )
+        G.append(0)
+        delta = 1
+        for _ in range(2*self.n-3):
+            for x in reversed(range(self.n-1)):
+                V[x] = V[x-1]
+            V[0] = 0
+            sign = mod3( -F[0] * G[0] )
+            if delta > 0 and G[0] != 0:
+                swap = True
+                delta = -delta
+            else:
+                swap = False
+            delta = delta + 1
+            if swap:
+                F, G = G, F
+                V, W = W, V
+            for x in range(self.n):
+                G[x] = mod3( G[x] + sign*F[x] )
+                W[x] = mod3( W[x] + sign*V[x] )
+            for x in range(self.n-1):
+                G[x] = G[x+1]
+            G[self.n-1] = 0
+
+        sign = F[0]
+        B = []
+        for x in range(self.n-1):
+            B.append( mod3( sign*V[self.n-2-x] ) )
+        B.append(0)
+        return B
+
+    def inversion_3_bits(self, AR):
+        # Here, each polynomial is held as a pair of integers (P, M); bit x
+        # of P is set if coefficient x is 1, and bit x of M is set if
+        # coefficient x is -1 (if neither is set, the coefficient is 0)
+        n = self.n
+        VP, VM = 0, 0
+        WP, WM = 1, 0
+        FP, FM = (1 << n) - 1, 0
+        GP, GM = 0, 0
+        for x in range(n-1):
+            v = mod3(AR[n-2-x] - AR[n-1])
+            if v == 1:
+                GP = GP | (1 << x)
+            elif v == -1:
+                GM = GM | (1 << x)
+        low = (1 << (n-1)) - 2     # The bits 1 through n-2
+        top = 1 << (n-1)           # The bit n-1
+        delta = 1
+        for _ in range(2*n-3):
+            # The list version shifts V up by one, keeping V[n-1] where it
+            # is, and clearing V[0]
+            VP = ((VP << 1) & low) | (VP & top)
+            VM = ((VM << 1) & low) | (VM & top)
+            # sign = -F[0]*G[0] (mod 3); that's 1 if F[0] and G[0] are
+            # nonzero and different, -1 if they're nonzero and the same
+            f0 = (FP & 1) - (FM & 1)
+            g0 = (GP & 1) - (GM & 1)
+            sign = mod3(-f0 * g0)
+            if delta > 0 and g0 != 0:
+                delta = -delta
+                FP, FM, GP, GM = GP, GM, FP, FM
+                VP, VM, WP, WM = WP, WM, VP, VM
+            delta = delta + 1
+            if sign != 0:
+                # Add sign*F to G, and sign*V to W; multiplying by -1 just
+                # swaps the 1 and -1 bits
+                if sign == 1:
+                    AP, AM, BP, BM = FP, FM, VP, VM
+                else:
+                    AP, AM, BP, BM = FM, FP, VM, VP
+                GP, GM = add_3_bits(GP, GM, AP, AM)
+                WP, WM = add_3_bits(WP, WM, BP, BM)
+            GP = GP >> 1
+            GM = GM >> 1
+
+        # B[x] is sign*V[n-2-x], where sign = F[0]
+        if FM & 1:
+            VP, VM = VM, VP
+        B = []
+        for x in range(n-1):
+            B.append( ((VP >> (n-2-x)) & 1) - ((VM >> (n-2-x)) & 1) )
+        B.append(0)
+        return B
+
+    def invert(self, A):
+        # Invert the polynomial A (mod q), that is, return the polynomial
+        # B such that A*B = 1 mod q, (x^n-1)/(x-1)
+        # Note that we do it mod (x^n-1)/(x-1) rather than the more expected
+        # x^n-1 (which is what we use in most places) because A will be a
+        # multiple of x-1, and hence an inverse mod x^n-1 won't exist
+
+        # The inversion code is not constant time.  To get around that, we
+        # blind A by multiplying it by a random polynomial R, getting A*R.
+        # A*R is uncorrelated to A; hence we don't mind if we leak it (because
+        # it's effectively a random value).  We compute (A*R)^-1 in nonconstant
+        # time; again, leakage here doesn't matter.  Once we have that, we
+        # compute R*(A*R)^-1 = A^-1, giving us the answer we want
+        R = self.sample_blinding()
+        AR = self.multiply( A, R )
+
+        # And now invert AR
+        # (this steps through AR one coefficient at a time; so we want it
+        # as a list, even if we're using the numpy arithmetic)
+        AR = self.as_list(AR)
+
+        # First, we invert the polynomial AR (mod 2)
+        B = self.inversion_2(AR)
+        # The lsbits of B are the lsbits of (A*R)^-1
+
+        # Now that we've computed the inverse mod 2, do four iterations
+        # of Newton-Raphson to extend it to cover all the bits of q, which
+        # is a power of 2
+        # 4 iterations are sufficient for q < 65536
+        # Yes, Newton-Raphson works, even though the normal calculus-based way
+        # of showing its correctness doesn't apply here; at the start of
+        # iteration n, if the lower k bits of the inverse are correct, then
+        # after iteration n, the lower 2k bits of the inverse are correct
+        MAR = self.multiply_int( AR, -1 )
+        for _ in range(4):
+            C = self.multiply( B, MAR )
+            C[0] = self.modq(C[0] + 2)
+            B = self.multiply( B, C )
+        # B is now (A*R)^-1
+
+        # And return the final result, which is R*(A*R)^-1
+        return self.multiply(B, R)
+
+    def invert_3(self, A):
+        # Invert the polynomial A (mod 3), that is, return the polynomial
+        # B such that A*B = 1 mod 3, (x^n-1)/(x-1)
+
+        # The inversion code is not constant time.  To get around that, we
+        # blind A by multiplying it by a random polynomial R, getting A*R.
+        # A*R is uncorrelated to A; hence we don't mind if we leak it (because
+        # it's effectively a random value).  We compute (A*R)^-1 in nonconstant
+        # time; again, leakage here doesn't matter.  Once we have that, we
+        # compute R*(A*R)^-1 = A^-1, giving us the answer we want
+        R = self.sample_blinding(3)    # Set R randomly
+        AR = self.multiply_3( A, R )
+
+        # And now invert AR
+        AR = self.as_list(AR)
+        B = self.inversion_3(AR)
+        # B is now (A*R)^-1
+
+        # And return the final result, which is R*(A*R)^-1
+        return self.multiply_3(B, R)
+
+    def sample_blinding(self, modulus=None):
+        # Pick the random R that invert (or, if modulus is 3, invert_3)
+        # blinds with
+        if modulus == 3:
+            return self.sample_iid()
+        # (q is a power of 2, no more than 2**16, so we can take each
+        # coefficient from the bottom bits of 16 random bits)
+        v = struct.unpack('<%dH' % self.n, self.rng.random_bytes(2*self.n))
+        R = []
+        for x in range(self.n):
+            R.append( (v[x] & (self.q-1)) - self.q//2 )
+        return R
+
+    #
+    # Invert each of the polynomials in the list A (mod q, or mod 3 if
+    # modulus is 3), and return the list of inverses; the same as calling
+    # invert (or invert_3) on each, but with only one call to it
+    # This is Montgomery's trick: we work out the running products P[0] =
+    # A[0], P[1] = A[0]*A[1], ..., P[k] = A[0]*...*A[k], and invert the last
+    # one.  Then, going back down, P[k]^-1 * P[k-1] = A[k]^-1, and P[k]^-1
+    # * A[k] = P[k-1]^-1, which we need for the next step.  That's one
+    # inversion and about 3 multiplies for each polynomial, rather than an
+    # inversion each
+    # As invert does, we blind each A[k] by a random R[k] first (and invert
+    # itself blinds the final product again).  If any of them has no
+    # inverse, neither does the product; in that case, we fall back to
+    # inverting them one at a time, so we return just what invert would
+    def invert_many(self, A, modulus=None):
+        if modulus == 3:
+            multiply, invert, mod_phin = (self.multiply_3, self.invert_3,
+                                          self.mod_phin_3)
+        else:
+            multiply, invert, mod_phin = (self.multiply, self.invert,
+                                          self.mod_phin)
+        if len(A) <= 1:
+            return [invert(a) for a in A]
+        R = [self.sample_blinding(modulus) for _ in A]
+        AR = [multiply(a, r) for a, r in zip(A, R)]
+        P = [AR[0]]
+        for ar in AR[1:]:
+            P.append(multiply(P[-1], ar))
+        P_inv = invert(P[-1])
+        # (check that it really is the inverse)
+        one = self.as_list(mod_phin(multiply(P[-1], P_inv)))
+        if one != [1] + [0] * (self.n-1):
+            return [invert(a) for a in A]
+        Inverses = [None] * len(A)
+        for k in range(len(A) - 1, 0, -1):
+            Inverses[k] = multiply(multiply(P_inv, P[k-1]), R[k])
+            P_inv = multiply(P_inv, AR[k])
+        Inverses[0] = multiply(P_inv, R[0])
+        return Inverses
+
+    def inversion_2(self, AR):
+        if self.inversion == 'bits':
+            return self.inversion_2_bits(AR)
+        return self.inversion_2_list(AR)
+
+    def inversion_3(self, AR):
+        if self.inversion == 'bits':
+            return self.inversion_3_bits(AR)
+        return self.inversion_3_list(AR)
+
+    def sample_iid(self):
+        # Generate a random trinary polynomial (that is, with all the terms
+        # either 0, 1 or -1); with the highest term being 0
+        # (we get all the random bytes we need at once; each coefficient
+        # comes from one byte)
+        F = []
+        for v in self.rng.random_bytes(self.n-1):
+            F.append(mod3(v))
+        F.append(0)
+        return F
+
+    def sample_fixed_type(self):
+        # Generate a random trinary polynomial of the proper weight; that is,
+        # q/16-1 of the digits are 1, q/16-1 are -1 and the rest are 0
+        # Because the number of 1 and -1 digits are the same, this polynomial
+        # will always be a multiple of x-1
+        # (each of the n-1 values uses 30 random bits, which we take from 4
+        # random bytes; we get all the random bytes we need at once)
+        r = struct.unpack('<%dI' % (self.n-1),
+                          self.rng.random_bytes(4*(self.n-1)))
+        S = []
+        for x in range(self.n - 1):
+            v = 4*(r[x] >> 2)             # Make the upper 30 bits random
+            if x < self.q//16 - 1:        # For q/16-1 of the values,
+                v = v + 1                 # set the two lsbits to 1
+            elif x < self.q//8 - 2:       # For q/16-1 of the values,
+                v = v + 2                 # set the two lsbits to 2
+            S.append(v)
+        # The sort order is (mostly) determined by the upper 30 bits,
+        # randomizing the order
+        # This should be a constant time sort; the sorting network is,
+        # python's built-in sort is not
+        if self.sort == 'network' and self.use_numpy:
+            S = sort_network_numpy(numpy.array(S, dtype=numpy.uint32))
+            S = S.tolist()
+        elif self.sort == 'network':
+            S = sort_network_list(S)
+        else:
+            S.sort()
+        for x in range(self.n - 1):       # Strip off the upper 30 bits
+            S[x] = mod3(S[x] % 4)         # and map 2 to -1
+        S.append(0)                       # Add a 0 as the very last element
+        return S
+
+    def sample_iid_plus(self):
+        # Generate a random trinary polynomial (as sample_iid does), which
+        # also has the 'non-negative correlation property'; that is, the sum
+        # of the products of each pair of adjacent coefficients is at least 0
+        # HRSS uses this for F and G
+        F = self.sample_iid()
+        T = 0
+        for x in range(self.n-1):
+            T = T + F[x]*F[x+1]
+        # If the sum is negative, flipping the sign of every other
+        # coefficient flips the sign of every one of those products
+        # This should be done in constant time; this isn't
+        if T < 0:
+            for x in range(0, self.n, 2):
+                F[x] = -F[x]
+        return F
+
+    #
+    # These generate count random polynomials at once, as the rows of a
+    # matrix (for the batched KEM routines; numpy arithmetic only).  They
+    # produce the same distribution as the routines above; they just get
+    # all their random bytes in a single call
+    def sample_iid_many(self, count):
+        F = numpy.zeros((count, self.n), dtype=numpy.int16)
+        v = numpy.frombuffer(self.rng.random_bytes(count * (self.n-1)),
+                             dtype=numpy.uint8)
+        F[:, :self.n-1] = mod3(v.reshape(count, self.n-1).astype(numpy.int16))
+        return F
+
+    def sample_fixed_type_many(self, count):
+        v = numpy.frombuffer(self.rng.random_bytes(4 * count * (self.n-1)),
+                             dtype='<u4')
+        v = 4 * (v.reshape(count, self.n-1) >> 2)
+        v[:, :self.q//16 - 1] += 1            # q/16-1 of the values are 1
+        v[:, self.q//16 - 1:self.q//8 - 2] += 2   # and q/16-1 are -1
+        if self.sort == 'network':
+            v = sort_network_numpy(v)
+        else:
+            v.sort(axis=1)
+        S = numpy.zeros((count, self.n), dtype=numpy.int16)
+        S[:, :self.n-1] = mod3((v % 4).astype(numpy.int16))
+        return S
+
+#
+# The table unpack_S3 uses: entry b holds the 5 trits that pack_S3 packs into
+# the byte b (ls-trit first, as 0, 1, -1).  Bytes above 242 can't come from
+# pack_S3; for those, we take the trits the same way (b, b/3, b/9, b/27,
+# b/81, each mod 3) anyway, so that every byte decodes to something
+S3_table = None
+
+def unpack_S3_table():
+    global S3_table
+    if S3_table is None:
+        S3_table = [tuple(mod3(b // 3**x) for x in range(5))
+                    for b in range(256)]
+    return S3_table
+
+class NTRU_prepared_publickey:
+    #
+    # A public key that has been unpacked (and prepared for multiplication)
+    # once, so that we can encapsulate to it many times without redoing that
+    # work.  NTRU_publickey.encrypt (and kem_encapsulate) accept this in
+    # place of the packed public key
+    def __init__(self, ntru, public_key):
+        self.public_key = bytes(public_key)
+        self.H = ntru.prepare(ntru.polynomial(ntru.unpack_Rq0(
+                                                      self.public_key)))
+
+class NTRU_publickey(NTRU_base):
+    #
+    # This is the code that deals with NTRU public operations, specifically
+    # encapsulate
+    #
+    # This object doesn't hold a public key as such; however, it does keep a
+    # small cache of the public keys it has recently encapsulated to (in
+    # prepared form), so that encapsulating to the same key over and over
+    # again doesn't unpack it every time.  public_key_cache_size is the
+    # most keys it will remember (0 turns the cache off); when it's full,
+    # the least recently used key is dropped
+
+    def __init__(self, parameter_set, public_key_cache_size=16, **options):
+        NTRU_base.__init__(self, parameter_set, **options)
+
+        # The sizes of the encoded polynomials
+        self.packed_Rq0_bytes = ((self.n-1) * self.logq + 7) // 8
+        self.packed_S3_bytes = (self.n-1 + 4) // 5
+        # Where each coefficient sits within a group of 8 (see pack_Rq0)
+        self.group_shifts = range(0, 8*self.logq, self.logq)
+        self.public_key_cache_size = public_key_cache_size
+        self.clear_public_key_cache()
+
+    def clear_public_key_cache(self):
+        self.public_key_cache = collections.OrderedDict()
+        self.public_key_cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_evictions = 0
+
+    def prepare_public_key(self, public_key):
+        # Return the NTRU_prepared_publickey for public_key (which may be
+        # one already), from the cache if we have it
+        if isinstance(public_key, NTRU_prepared_publickey):
+            return public_key
+        public_key = bytes(public_key)
+        with self.public_key_cache_lock:
+            prepared = self.public_key_cache.get(public_key)
+            if prepared is not None:
+                self.cache_hits = self.cache_hits + 1
+                self.public_key_cache.move_to_end(public_key)
+                return prepared
+            self.cache_misses = self.cache_misses + 1
+        prepared = NTRU_prepared_publickey(self, public_key)
+        if self.public_key_cache_size > 0:
+            with self.public_key_cache_lock:
+                self.public_key_cache[public_key] = prepared
+                while len(self.public_key_cache) > self.public_key_cache_size:
+                    self.public_key_cache.popitem(last=False)
+                    self.cache_evictions = self.cache_evictions + 1
+        return prepared
+
+    def cache_stats(self):
+        # Return the public key cache counters
+        with self.public_key_cache_lock:
+            return {
+                'size': len(self.public_key_cache),
+                'max_size': self.public_key_cache_size,
+                'hits': self.cache_hits,
+                'misses': self.cache_misses,
+                'evictions': self.cache_evictions,
+            }
+
+    # The cache (and its lock) isn't sent along if this object is pickled
+    # (for example, to or from a key pool worker); the copy starts out with
+    # an empty one
+    def __getstate__(self):
+        state = NTRU_base.__getstate__(self)
+        del state['public_key_cache']
+        del state['public_key_cache_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.clear_public_key_cache()
+
+    # This encodes a polynomial into a byte string using the pack_Rq0 procedure
+    # This assumes that the polynomial is a multiple of x-1 (which is always
+    # true; H will always be a multiple of G, and we select G so that it is a
+    # multiple of x-1)
+    #
+    # This is the obvious version, which moves one bit at a time; pack_Rq0
+    # (below) computes the same thing a word at a time
+    def pack_Rq0_reference(self, H):
+        list = bytearray()
+        bit_out = 1
+        next_val = 0
+        for x in range(self.n-1):
+            bit_in = 1
+            while bit_in < self.q:
+                # Extract the next bit of this coefficient (in lsb-first order)
+                next_bit = (H[x] // bit_in) % 2
+
+                # Insert that bit into the output (in lsb-first order)
+                next_val = next_val + next_bit * bit_out
+
+                # And update variables to make sure things go in the right
+                # order
+                bit_in = 2*bit_in
+                bit_out = 2*bit_out
+
+                # If we've filled up this output byte, insert it onto the
+                # output string
+                if bit_out == 256:
+                    list.append(next_val)
+                    bit_out = 1
+                    next_val = 0
+
+        # And if we have a partial byte, insert that into the output string
+        # as well
+        if bit_out > 1:
+            list.append(next_val)
+        return list
+
+    # This converts a byte string (created by pack_Rq0) back into our
+    # internal polynomial representation
+    # Again, this is the one bit at a time version of unpack_Rq0
+    def unpack_Rq0_reference(self, list):
+        H = []
+        bit_in = 1
+        bit_out = 1
+        next_val = 0
+        total_bytes = 0
+        x = 0
+        sum = 0
+        while total_bytes < self.n-1:
+
+            # Extract the next bit of the string (in lsb-first order)
+            next_bit = (list[x] // bit_in) % 2
+
+            # Insert that bit into the next coefficient (in lsb-first order)
+            next_val = next_val + next_bit * bit_out
+
+            # Step to the next input bit
+            bit_in = 2*bit_in
+            if bit_in == 256:
+                x = x + 1         # Ran out of bits in this byte; step to
+                bit_in = 1        # the next byte
+
+            # Step to the next output bit
+            bit_out = 2*bit_out
+
+            # If we've filled the coefficent, append it to the list
+            if bit_out == self.q:
+                H.append(self.modq(next_val))
+                total_bytes = total_bytes+1
+
+                # We track the sum of all the coefficients
+                sum = sum + next_val
+
+                # And start on the next coefficient
+                bit_out = 1
+                next_val = 0
+
+        # Reconstruct the last coefficent; it's minus the sum of all the
+        # coefficients we did read (for polynomials that are multiples of
+        # x-1, the sum of the coefficients is 0)
+        H.append(self.modq(-sum))
+        return H
+
+    # Pack a trinary polynomial (one whose elements are all 0, 1, -1)
+    # into a bytestring.
+    # If there's an element of A that's not 0, 1 or -1, then it doesn't
+    # matter what we map it to - this output will end up being ignored
+    # This is the one trit at a time version of pack_S3
+    def pack_S3_reference(self, A):
+        list = bytearray()
+        num_byte = 0          # The next byte to output to the string
+        mult = 1              # Where the next element goes within the
+                              # next byte
+        collected = 0         # The number of coefficients we have
+                              # inserted into this next byte
+        for x in range(self.n-1):
+               # Grab the next coefficient and add it into the buffer
+               # in ls-trit first order
+               val =  A[x]
+               val = val % 3   # We encode -1 elements as '2'
+               num_byte = num_byte + mult*val
+               mult = 3*mult
+               collected = collected + 1
+
+               # If we've collected 5 coefficients, or we hit the lsat
+               # coefficient, deposit the byte we have
+               if collected == 5 or x == self.n-2:
+                   list.append(num_byte)
+                   num_byte = 0
+                   mult = 1
+                   collected = 0
+        return list
+
+    #
+    # These are the versions of pack_Rq0, unpack_Rq0 and pack_S3 that we
+    # actually use.  Rather than moving one bit (or trit) at a time, they
+    # move whole groups:
+    #  - 8 coefficients of logq bits take exactly logq bytes; so pack_Rq0
+    #    combines each group of 8 coefficients into one integer, and
+    #    converts that into logq bytes in one step (and unpack_Rq0 does the
+    #    reverse)
+    #  - pack_S3 combines each group of 5 trits into a byte arithmetically,
+    #    and unpack_S3 looks each byte up in a table of the 5 trits it holds
+    #
+    # The _into versions write the result into a buffer the caller supplies
+    # (a bytearray, or a writable memoryview), starting at offset, and
+    # return the number of bytes written.  The unpack routines accept any
+    # bytes-like object (including a memoryview), and an offset into it;
+    # they don't copy it.  If there are fewer bytes after offset than the
+    # packed polynomial takes, they raise ValueError; so a truncated
+    # ciphertext or key is rejected the same way whichever arithmetic (or
+    # decrypt) we use.  Any bytes past the end are ignored, as
+    # unpack_Rq0_reference ignores them
+    def pack_Rq0(self, H):
+        if self.use_numpy:
+            return self.pack_Rq0_many([H])[0]
+        buffer = bytearray(self.packed_Rq0_bytes)
+        self.pack_Rq0_into(H, buffer)
+        return buffer
+
+    def pack_Rq0_into(self, H, buffer, offset=0):
+        if self.use_numpy:
+            packed = self.pack_Rq0_many([H])[0]
+        else:
+            logq = self.logq
+            V = [h % self.q for h in H[:self.n-1]]
+            V.extend([0] * (-len(V) % 8))     # Pad out the last group
+            packed = bytearray()
+            for x in range(0, len(V), 8):
+                group = 0
+                for shift, v in zip(self.group_shifts, V[x:x+8]):
+                    group = group | (v << shift)
+                packed += group.to_bytes(logq, 'little')
+            del packed[self.packed_Rq0_bytes:]
+        memoryview(buffer)[offset:offset+len(packed)] = packed
+        return len(packed)
+
+    def unpack_Rq0(self, list, offset=0):
+        if self.use_numpy:
+            end = offset + self.packed_Rq0_bytes
+            return self.unpack_Rq0_many([memoryview(list)[offset:end]])[0]
+        return [self.modq(v) for v in self.unpack_Rq0_unsigned(list, offset)]
+
+    def unpack_Rq0_unsigned(self, list, offset=0):
+        # The same as unpack_Rq0, except that the coefficients are between 0
+        # and q-1 (rather than in the balanced representation), and it
+        # always returns a list
+        data = memoryview(list)[offset:offset+self.packed_Rq0_bytes]
+        if len(data) != self.packed_Rq0_bytes:
+            raise ValueError    # Too short to be a packed polynomial
+        logq = self.logq
+        mask = self.q - 1
+        V = []
+        for x in range(0, len(data), logq):
+            # The last group may be short; that's fine, from_bytes just
+            # gives us zeros for the missing high coefficients
+            group = int.from_bytes(data[x:x+logq], 'little')
+            V.extend([(group >> shift) & mask for shift in self.group_shifts])
+        del V[self.n-1:]
+        # Reconstruct the last coefficent from the sum of the others, as
+        # unpack_Rq0_reference does
+        V.append(-sum(V) % self.q)
+        return V
+
+    def pack_S3(self, A):
+        if self.use_numpy:
+            return self.pack_S3_many([A])[0]
+        buffer = bytearray(self.packed_S3_bytes)
+        self.pack_S3_into(A, buffer)
+        return buffer
+
+    def pack_S3_into(self, A, buffer, offset=0):
+        if self.use_numpy:
+            packed = self.pack_S3_many([A])[0]
+        else:
+            V = [a % 3 for a in A[:self.n-1]]   # We encode -1 as '2'
+            V.extend([0] * (-len(V) % 5))       # Pad out the last group
+            packed = bytes([a + 3*b + 9*c + 27*d + 81*e
+                            for a, b, c, d, e in zip(V[0::5], V[1::5],
+                                                     V[2::5], V[3::5],
+                                                     V[4::5])])
+        memoryview(buffer)[offset:offset+len(packed)] = packed
+        return len(packed)
+
+    # This converts a byte string created by pack_S3 back into a trinary
+    # polynomial (the last coefficient, which pack_S3 doesn't include, is 0)
+    def unpack_S3(self, list, offset=0):
+        data = memoryview(list)[offset:offset+self.packed_S3_bytes]
+        if len(data) != self.packed_S3_bytes:
+            raise ValueError    # Too short to be a packed polynomial
+        table = unpack_S3_table()
+        A = []
+        for byte in data:
+            A.extend(table[byte])
+        del A[self.n-1:]
+        A.append(0)
+        if self.use_numpy:
+            return self.narrow(numpy.array(A))
+        return A
+
+    #
+    # The numpy versions of pack_Rq0, unpack_Rq0 and pack_S3; these work on
+    # a whole batch of polynomials (the rows of a matrix) at once
+    def pack_Rq0_many(self, H):
+        # Split each coefficient into its logq bits (lsb first), and then
+        # pack that string of bits into bytes (again lsb first)
+        values = self.wide(H)[:, :self.n-1] % self.q
+        bits = (values[:, :, None] >> numpy.arange(self.logq)) & 1
+        bits = bits.reshape(len(values), -1).astype(numpy.uint8)
+        packed = numpy.packbits(bits, axis=1, bitorder='little')
+        return [bytearray(row.tobytes()) for row in packed]
+
+    def unpack_Rq0_many(self, lists):
+        # The reverse of pack_Rq0_many; split the strings into bits, and
+        # regroup them into logq-bit coefficients
+        size = self.packed_Rq0_bytes
+        lists = [memoryview(list)[:size] for list in lists]
+        if any(len(list) != size for list in lists):
+            raise ValueError    # Too short to be a packed polynomial
+        strings = numpy.frombuffer(b''.join(lists), dtype=numpy.uint8)
+        bits = numpy.unpackbits(strings.reshape(len(lists), -1), axis=1,
+                                bitorder='little')
+        bits = bits[:, :(self.n-1)*self.logq]
+        bits = bits.reshape(len(lists), self.n-1, self.logq)
+        values = bits.astype(numpy.int64) @ (1 << numpy.arange(self.logq))
+        # The last coefficient is minus the sum of the others
+        values = numpy.append(values, -values.sum(axis=1, keepdims=True),
+                              axis=1)
+        return self.narrow(self.modq(values))
+
+    def pack_S3_many(self, A):
+        # Group the coefficients (as 0, 1, 2) into sets of 5, padding the
+        # last set with zeros, and combine each set into a byte
+        values = self.wide(A)[:, :self.n-1] % 3
+        pad = numpy.zeros((len(values), -(self.n-1) % 5), dtype=numpy.int64)
+        values = numpy.concatenate((values, pad), axis=1)
+        packed = values.reshape(len(values), -1, 5) @ [1, 3, 9, 27, 81]
+        return [bytearray(row.tobytes())
+                for row in packed.astype(numpy.uint8)]
+
+    #
+    # This SHA3-256 hashes two trinary polynomials together
+    # We pack both into one buffer (see hash_buffer), and hash that; which
+    # is the same as hashing the two packed strings one after the other
+    def hash_two_trinary_polynomials(self, A, B):
+        if self.use_numpy:
+            return hash_two_strings( self.pack_S3( A ), self.pack_S3( B ) )
+        buffer = hash_buffer(2*self.packed_S3_bytes)
+        offset = self.pack_S3_into(A, buffer)
+        self.pack_S3_into(B, buffer, offset)
+        return hashlib.sha3_256(buffer).digest()
+
+    # And this does the same for each pair of rows of A and B
+    def hash_two_trinary_polynomials_many(self, A, B):
+        return [hash_two_strings(a, b)
+                for a, b in zip(self.pack_S3_many(A), self.pack_S3_many(B))]
+
+    #
+    # This is the deterministic public key encryption routine
+    # It should not be called directly by the application
+    def encrypt(self, public_key, R, M):
+        # Unpack the public key (or rather, find it already unpacked, if
+        # we've used it recently)
+        H = self.prepare_public_key(public_key).H
+
+        # And we encrypt it by multiplying R*H, and then adding M (or, for
+        # HRSS, the lifted M)
+        C = self.add( self.multiply( R, H ), self.lift(M) )
+
+        # And that's the ciphertext (converted into the 'on-the-wire'
+        # format)
+        return self.pack_Rq0(C)
+    #
+    # This is the KEM encapsulate routine
+    # It returns the key share and the shared secret
+    def kem_encapsulate(self, public_key):
+        # Select random R, M polynomials
+        # (HRSS selects M the same way as R)
+        R = self.sample_iid()
+        if self.hrss:
+            M = self.sample_iid()
+        else:
+            M = self.sample_fixed_type()
+
+        # Generate a ciphertext conveying those values
+        C = self.encrypt(public_key, R, M)
+
+        # Create a shared secret based on the random values we selected
+        K = self.hash_two_trinary_polynomials(R, M)
+
+        # And return the ciphertext, along with the shared secret
+        return C, K
+
+    #
+    # This is the batched KEM encapsulate routine; it encapsulates to each
+    # of the public keys in the list public_keys, and returns the list of
+    # (ciphertext, shared secret) pairs, just as if we had called
+    # kem_encapsulate on each one
+    # With the numpy arithmetic, the batch is handled as a matrix whose rows
+    # are polynomials, and each step is done on the whole batch at once
+    def kem_encapsulate_many(self, public_keys):
+        if not self.use_numpy:
+            return [self.kem_encapsulate(public_key)
+                    for public_key in public_keys]
+        if not public_keys:
+            return []       # (the matrices below need at least one row)
+        count = len(public_keys)
+
+        # Select random R, M polynomials (count of each)
+        R = self.sample_iid_many(count)
+        if self.hrss:
+            M = self.sample_iid_many(count)
+        else:
+            M = self.sample_fixed_type_many(count)
+
+        # Unpack the public keys.  Usually, we are encapsulating to the same
+        # key many times; if so, we unpack it once, and every R gets
+        # multiplied by the same H (which is a single matrix product)
+        public_keys = [self.prepare_public_key(public_key)
+                       for public_key in public_keys]
+        if all(public_key is public_keys[0] for public_key in public_keys):
+            H = public_keys[0].H
+        else:
+            H = self.unpack_Rq0_many([public_key.public_key
+                                      for public_key in public_keys])
+
+        # Encrypt (as in encrypt), and generate the shared secrets
+        C = self.pack_Rq0_many(self.add(self.multiply(R, H), self.lift(M)))
+        K = self.hash_two_trinary_polynomials_many(R, M)
+
+        return list(zip(C, K))
+
+class NTRU_kronecker_fields:
+    #
+    # One way of laying out the n coefficients of a polynomial in a big
+    # integer, each in its own field of 'size' bytes (see kronecker_pack);
+    # the fields are just wide enough to hold values up to bound
+    def __init__(self, n, bound):
+        self.n = n
+        self.size = (bound.bit_length() + 7) // 8
+        self.width = 8 * self.size
+        self.shift = n * self.width     # Where the x^n coefficient starts
+        self.low = (1 << self.shift) - 1
+        self.ones = self.pack([1] * n)  # 1 in every field
+
+    def pack(self, A):
+        return kronecker_pack(A, self.size)
+
+    def unpack(self, p):
+        return kronecker_unpack(p, self.n, self.size)
+
+    def fold(self, p):
+        # Reduce a product of two polynomials mod x^n-1, by adding the
+        # coefficients of x^n and up back onto the bottom ones
+        return (p & self.low) + (p >> self.shift)
+
+class NTRU_decryption_context:
+    #
+    # What NTRU_privatekey.decrypt_fused works out once for a private key,
+    # rather than on every decryption
+    #
+    # decrypt_fused keeps its polynomials as the integers convolve_kronecker
+    # uses (each coefficient in its own field), with the coefficients held
+    # as values between 0 and q-1 (or 0 and 2, for polynomials mod 3) rather
+    # than balanced.  That way, most of the work on the coefficients
+    # (reducing them mod q or mod 3, adding a constant to each, checking
+    # them) is a single operation on a big integer, rather than a Python
+    # step per coefficient.  So we hold F, F_inv and H_inv in that form,
+    # along with the constants we need
+    #
+    # Each of the three products uses fields just wide enough for it: the
+    # time to multiply two big integers grows faster than their length, and
+    # the product mod 3 needs much narrower fields than the other two
+    def __init__(self, ntru):
+        n = ntru.n
+        q = ntru.q
+        # (we remember which polynomials we were built from, so that we can
+        # tell if the key is replaced)
+        self.F = ntru.F
+        self.F_inv = ntru.F_inv
+        self.H_inv = ntru.H_inv
+
+        # C*(F+1), reduced mod x^n-1, and with q/2 added; see decrypt_fused
+        # for why we multiply by F+1 (whose coefficients are 0, 1 or 2),
+        # rather than F
+        self.fields_a = NTRU_kronecker_fields(n, n * (q-1) * 2 + q)
+        self.F1 = self.fields_a.pack([f + 1 for f in ntru.as_list(ntru.F)])
+        ones = self.fields_a.ones
+        self.mask_q_a = (q-1) * ones       # Reduces every field mod q
+        self.half_q = (q//2) * ones
+        # To reduce every field of that mod 3, we repeatedly add the bottom
+        # k bits of each field (for some even k) to the rest of it; as 2^k
+        # is 1 mod 3, that doesn't change it mod 3, and we pick k to make the
+        # largest value we could get as small as possible.  Once that is 4
+        # or less, subtracting 3 from the fields that are 3 or 4 finishes it
+        self.mod3_steps = []
+        largest = q - 1
+        while largest > 4:
+            k = min(range(2, largest.bit_length(), 2),
+                    key=lambda k: 2**k - 1 + (largest >> k))
+            high = 2**(largest >> k).bit_length() - 1
+            self.mod3_steps.append((k, (2**k - 1) * ones, high * ones))
+            largest = 2**k - 1 + (largest >> k)
+        self.fours = 4 * ones
+
+        # That, times F_inv, needs fields to hold only 4n.  For HRSS, what we
+        # want is not M itself, but M/(x-1), to lift it (see lift); so we
+        # multiply by F_inv/(x-1) instead
+        self.fields_m = NTRU_kronecker_fields(n, 4 * n)
+        F_inv = ntru.F_inv
+        if ntru.hrss:
+            F_inv = ntru.multiply_3(F_inv, ntru.phi1_inverse_3())
+        F_inv = [f % 3 for f in ntru.as_list(F_inv)]
+        self.F_inv3 = self.fields_m.pack(F_inv)
+        # What we need to add to each coefficient of that product (again,
+        # see decrypt_fused)
+        self.adjust_3 = -(q//2) * sum(F_inv) % 3
+
+        # The ciphertext, less the lifted message, is multiplied by H_inv; we
+        # add 'offset' to every coefficient of that difference to keep them
+        # nonnegative (the lifted message has coefficients between -1 and 1
+        # for HPS, and -2 and 2 for HRSS).  That product is the one with the
+        # largest coefficients (and each field also needs room to add q)
+        self.offset = 2 if ntru.hrss else 1
+        self.fields_r = NTRU_kronecker_fields(
+                                n, n * (q - 1 + 2*self.offset) * (q-1) + q)
+        H_inv = [h % q for h in ntru.as_list(ntru.H_inv)]
+        self.H_invq = self.fields_r.pack(H_inv)
+        # What we need to add to each coefficient of that product
+        self.adjust_q = -self.offset * sum(H_inv) % q
+        ones = self.fields_r.ones
+        self.mask_q_r = (q-1) * ones
+        self.high_bits = (2**self.fields_r.width - 4) * ones  # All but the
+                                                              # bottom 2 bits
+
+class NTRU_prepared_privatekey:
+    #
+    # The private key polynomials decrypt multiplies by (F, F_inv mod 3, and
+    # H_inv), each prepared for our multiplication backend (see prepare): for
+    # kronecker, already evaluated as big integers (and F, which is ternary,
+    # in the form its ternary kernel wants); for karatsuba, already split
+    # into the pieces it multiplies by; for schoolbook, F as the lists of
+    # where its 1 and -1 coefficients are.  So decrypt only has to do the
+    # ciphertext's side of each multiply
+    def __init__(self, ntru):
+        # (again, we remember which polynomials we were built from)
+        self.F = ntru.F
+        self.F_inv = ntru.F_inv
+        self.H_inv = ntru.H_inv
+        self.F_prepared = ntru.prepare(ntru.F)
+        self.F_inv_prepared = ntru.prepare(ntru.F_inv, 3)
+        self.H_inv_prepared = ntru.prepare(ntru.H_inv)
+
+class NTRU_privatekey(NTRU_publickey):
+    #
+    # This is the code that deals with NTRU private operations, specifically
+    # key_gen and encapsulate
+    #
+    # This can hold a private key; this private key is summarized by:
+    #  - F, a secret trinary polynomial
+    #  - H, the public key F^-1 G (where G is a secret balanced trinary
+    #       polynomial).  This is here so that we could have a method to
+    #       reexport the public key (which we don't have at the moment)
+    #  - H_inv, which is H^-1; not secret, but is useful during decryption
+    #  - F_inv, which is F^-1 (computed over modulo 3)
+    #  - S, which is a random 32 byte string; it is used to disguise
+    #       decryption failures
+
+    def __init__(self, parameter_set, fused_decrypt=None, **options):
+        # fused_decrypt selects whether kem_decapsulate uses decrypt_fused
+        # (which gives the same answers as decrypt, but much faster) rather
+        # than decrypt (which does things the obvious way, one step at a
+        # time).  decrypt_fused does its multiplies by Kronecker
+        # substitution, and so, by default, we use it if that's (one of) the
+        # backends we've been asked for (or if we're using the numpy
+        # arithmetic, which it also beats for single ciphertexts)
+        NTRU_publickey.__init__(self, parameter_set, **options)
+        if fused_decrypt is None:
+            fused_decrypt = self.multiply_backend in ('kronecker', 'numpy')
+        self.fused_decrypt = fused_decrypt
+        self.decrypt_context = None
+        self.decrypt_operands = None
+        self.decoy_state = None
+        # The size of the encoded private key (see pack_private_key)
+        self.packed_private_key_bytes = 2*self.packed_S3_bytes + \
+                                        self.packed_Rq0_bytes + 32
+
+    #
+    # This is the key generation routine; it returns the public key
+    def key_gen(self):
+        # Select small F, G parameters
+        F, G = self.key_gen_sample()
+
+        # And construct the public key
+        FG = self.multiply(F, G)         # FG = F*G
+        FG_inv = self.invert(FG)         # FG_inv = (F*G)^-1
+
+        # F_inv = F^-1 (but this time, over polynomials modulo 3)
+        F_inv = self.invert_3(F)
+
+        return self.key_gen_finish(F, G, FG_inv, F_inv)
+
+    def key_gen_sample(self):
+        # Select the small F, G parameters for a new key
+        if self.hrss:
+            # For HRSS, G is x-1 times a random trinary polynomial (which
+            # makes it a multiple of x-1, just as it is for HPS)
+            F = self.sample_iid_plus()
+            G = self.multiply_phi1(self.sample_iid_plus())
+        else:
+            F = self.sample_iid()
+            G = self.sample_fixed_type()
+
+        # Multiply G by 3 (because, during decryption, we'll take
+        # things modulo 3, which will cause multiples of 3G to fall out)
+        G = self.multiply_int(G, 3)
+        return F, G
+
+    def key_gen_finish(self, F, G, FG_inv, F_inv):
+        # Make F (along with the rest of the key, given FG_inv and F_inv) our
+        # key, and return the public key
+        self.F = F
+
+        # H = F^-1 * G
+        # This is the public key
+        self.H = self.multiply(self.multiply(FG_inv, G), G)
+
+        # H_inv = F * G^-1
+        # This is computable from the public key; we use it to
+        # speed up the decryption process
+        # Like all the inverses here, it's only defined mod (x^n-1)/(x-1); we
+        # reduce it (and F_inv) by that, which makes the last coefficient 0,
+        # as the draft's private key encoding expects (see pack_private_key)
+        H_inv = self.multiply(self.multiply(FG_inv, F), F)
+        self.H_inv = self.mod_phin(H_inv)
+        self.F_inv = self.mod_phin_3(F_inv)
+
+        # And select the random S string (used to disguise KEM failure)
+        self.S = bytearray(self.rng.random_bytes(32))
+
+        # We keep the key polynomials in the compact form (see polynomial)
+        self.F = self.polynomial(self.F, 3)
+        self.F_inv = self.polynomial(self.F_inv, 3)
+        self.H = self.polynomial(self.H)
+        self.H_inv = self.polynomial(self.H_inv)
+
+        # Work out what decryption needs from the key now, rather than on
+        # the first decryption
+        self.precompute()
+
+        # And return the public key
+        return self.pack_Rq0(self.H)
+
+    #
+    # This generates count keys at once, and returns them as a list of
+    # (NTRU_privatekey, public key) pairs (as keypool.generate_keypair
+    # does); each key is in a new object, set up just like this one (and
+    # sharing its rng); our own key isn't changed
+    # The expensive part of key_gen is the two inversions; here, we do all
+    # the keys' inversions with invert_many, which needs only one inversion
+    # (of each kind) for the lot
+    def key_gen_many(self, count):
+        samples = [self.key_gen_sample() for _ in range(count)]
+        FG_inv = self.invert_many([self.multiply(F, G) for F, G in samples])
+        F_inv = self.invert_many([F for F, G in samples], 3)
+        keys = []
+        for (F, G), fg_inv, f_inv in zip(samples, FG_inv, F_inv):
+            key = copy.copy(self)   # (which starts its own public key cache)
+            key.decrypt_context = None
+            key.decrypt_operands = None
+            key.decoy_state = None
+            keys.append((key, key.key_gen_finish(F, G, fg_inv, f_inv)))
+        return keys
+
+    #
+    # Check if M is a legal value; return 0 if it is, a nonzero 16 bit
+    # value if it is not
+    # In this case, legal means it is a possible output of sample_fixed_type,
+    # that is, it consists of q/16-1 1's, q/16-1 -1's and the rest are 0
+    # (and the last element is always 0)
+    # For HRSS, M was selected the same way as R, and so legal means the
+    # same as it does for check_r (and as decrypt computes M modulo 3 and
+    # (x^n-1)/(x-1), that will always be true)
+    def check_m(self, M):
+        if self.hrss:
+            return self.check_r(M)
+        if self.use_numpy:
+            # The same checks as below, done on the whole array at once
+            # (if M is a batch, this returns the failure flag for each row)
+            M = self.wide(M)
+            v = M[..., :self.n-1]
+            failure = M[..., self.n-1]
+            failure = failure | numpy.bitwise_or.reduce((v+1) & 0xfffc, axis=-1)
+            failure = failure | numpy.bitwise_or.reduce((v+2) & 0xfffc, axis=-1)
+            failure = failure | ((v & 2).sum(axis=-1) - 2*(self.q//16 - 1))
+            failure = failure | v.sum(axis=-1)
+            return failure if M.ndim > 1 else int(failure)
+        failure = M[self.n-1]    # We set failure to nonzero if any error
+                                 # is detected
+        count_1 = 0              # The number of 1's minus the number of -1's
+        count_2 = 0              # Twice number of -1's counted
+        for x in range(self.n-1):
+            v = M[x]
+            count_1 = count_1 + v  # Increment if v=1, decrement if v=-1
+            count_2 = count_2 + (v & 2) # Double Increment count_2 if v is -1
+
+            # We also set failure if v is not -1,0,1
+            failure = failure | ((v+1) & 0xfffc) # Fail if v not [-1,0,1,2]
+            failure = failure | ((v+2) & 0xfffc) # Fail if v not [-2,-1,0,1]
+
+        # Mark failure if we didn't see precisely q/16-1 -1's
+        failure = failure | (count_2 - 2*(self.q//16 - 1))
+
+        # Mark failure if we didn't see the same number of 1's and -1's
+        # If we passed the previous test, there must be q/16-1 -1's, and hence
+        # there must also have been q/16-1 1's
+        failure = failure | count_1
+
+        return failure
+    
+    #
+    # Check if R is a legal value; return 0 if it is
+    # In this case, legal means it is a possible output of sample_iid,
+    # that is, 'all values either 0, 1 or -1' and the last element 0
+    def check_r(self, R):
+        if self.use_numpy:
+            R = self.wide(R)
+            v = R[..., :self.n-1]
+            failure = R[..., self.n-1]
+            failure = failure | numpy.bitwise_or.reduce((v+1) & 0xfffc, axis=-1)
+            failure = failure | numpy.bitwise_or.reduce((v+2) & 0xfffc, axis=-1)
+            return failure if R.ndim > 1 else int(failure)
+        failure = 0          # We set failure to nonzero if any error
+                             # is detected
+        for x in range(self.n-1):
+            v = R[x]
+            # failure will remain 0 if the value is in the range (-1, 0, 1, 2)
+            failure = failure | ((v+1) & 0xfffc)
+            # t will remain 0 if the value is in the range (-2, -1, 0, 1)
+            failure = failure | ((v+2) & 0xfffc)
+
+        # The last coefficient must also be 0
+        failure = failure | R[self.n-1]
+
+        return failure
+
+    #
+    # This is the deterministic public key decryption routine
+    # It should not be called directly by the application
+    def decrypt(self, C):
+        # Step one is supposed to check if C = 0 mod x-1; however because
+        # of how the unpack_Rq0 logic works, that is always true
+
+        # Compute A = C*F, which is R*G + M*F assuming the encryptor was legit
+        # (we multiply by the key polynomials in the form prepared for our
+        # backend; see NTRU_prepared_privatekey)
+        key = self.prepared_private_key()
+        A = self.multiply(C, key.F_prepared)
+
+        # Compute A*F^{-1} mod 3; every element of R*G is a multiple of 3, and
+        # so this is M*F*F^{-1} = M (mod 3), assuming the encryptor was legit
+        M = self.multiply_3(A, key.F_inv_prepared)
+
+        # For HRSS, M can have any last coefficient; reduce it modulo
+        # (x^n-1)/(x-1) (which is what we need to lift it); for HPS, that's
+        # not needed
+        if self.hrss:
+            M = self.mod_phin_3(M)
+
+        # So, if the ciphertext is valid, then M is the same value the
+        # encryptor selected
+ 
+        # Reconstruct the encryptor's R by computing (C-M)*H^{-1} (or, for
+        # HRSS, (C-lift(M))*H^{-1})
+        CMP = self.subtract( C, self.lift(M) )
+        R = self.multiply( CMP, key.H_inv_prepared )
+        R = self.mod_phin(R)   # self.H_inv was computed modulo (x^n-1)/(x-1)
+                               # scrub off the multiple of x-1 that may remain
+
+        # Check if R, M is a legal value
+        # If this was an invalid ciphertext, these will not be legit
+        failure_flag = self.check_m(M)
+        failure_flag = failure_flag | self.check_r(R)
+
+        return (R,M,failure_flag)
+
+    def decryption_context(self):
+        # Return the NTRU_decryption_context for our key, working it out if
+        # we haven't yet (or if the key has changed since we did)
+        context = self.decrypt_context
+        if context is None or context.F is not self.F or \
+               context.F_inv is not self.F_inv or \
+               context.H_inv is not self.H_inv:
+            context = NTRU_decryption_context(self)
+            self.decrypt_context = context
+        return context
+
+    def prepared_private_key(self):
+        # The same, for the NTRU_prepared_privatekey decrypt uses
+        key = self.decrypt_operands
+        if key is None or key.F is not self.F or \
+               key.F_inv is not self.F_inv or \
+               key.H_inv is not self.H_inv:
+            key = NTRU_prepared_privatekey(self)
+            self.decrypt_operands = key
+        return key
+
+    def precompute(self):
+        # Work out (now) everything decapsulation will need from our key:
+        # the context for decrypt_fused, if we use it, and the key
+        # polynomials prepared for decrypt, if we use that (which, with the
+        # numpy arithmetic, kem_decapsulate_many does).  key_gen and
+        # unpack_private_key call this; if the key is changed some other way
+        # (or we've been unpickled, which leaves these out), they are worked
+        # out on the first decryption instead
+        if self.fused_decrypt:
+            self.decryption_context()
+        if self.use_numpy or not self.fused_decrypt:
+            self.prepared_private_key()
+
+    #
+    # The decoy shared secret for the ciphertext C is the SHA3-256 hash of S
+    # followed by C.  Rather than hash S again for every ciphertext, we keep
+    # a SHA3 object that has already been given S (rebuilding it if S
+    # changes), and hash C with a copy of that.  SHA3's rate (136 bytes) is
+    # larger than S, so this doesn't save a permutation; what it saves is
+    # setting up a new hash object and passing S to it
+    def decoy_hash(self, C):
+        state = self.decoy_state
+        if state is None or state[0] is not self.S:
+            state = (self.S, hashlib.sha3_256(self.S))
+            self.decoy_state = state
+        hash = state[1].copy()
+        hash.update(C)
+        return hash.digest()
+
+    # (hashlib objects can't be pickled; the copy makes its own.  And, as
+    # they are bigger than the key itself, we leave out the precomputed
+    # forms of the key too)
+    def __getstate__(self):
+        state = NTRU_publickey.__getstate__(self)
+        state['decoy_state'] = None
+        state['decrypt_context'] = None
+        state['decrypt_operands'] = None
+        return state
+
+    #
+    # This does the same as unpack_Rq0 followed by decrypt, with the
+    # polynomials held as Kronecker integers (see NTRU_decryption_context)
+    # throughout.  Rather than build a new list of coefficients (and make a
+    # Python call per coefficient) for each step, it reduces whole
+    # polynomials with single big integer operations, and works the checks
+    # of M and R into those same operations.  It returns R, M and the
+    # failure flag as decrypt does, except that R and M are lists of values
+    # that are only correct modulo 3 (which is all that hashing them needs)
+    def decrypt_fused(self, C_packed):
+        context = self.decryption_context()
+        n = self.n
+        q = self.q
+
+        # The ciphertext, with coefficients between 0 and q-1
+        C = self.unpack_Rq0_unsigned(C_packed)
+
+        # Compute A = C*F.  As F's coefficients are -1, 0 or 1, we can use
+        # F+1 (which makes them nonnegative) instead; that adds C*(1 + x +
+        # ... + x^(n-1)) to the product, every coefficient of which is the
+        # sum of the coefficients of C, which is 0 mod q (C is a multiple of
+        # x-1)
+        fields = context.fields_a
+        a = fields.fold(fields.pack(C) * context.F1)
+        # Take A mod q, balanced; we actually hold A + q/2 (so that it is
+        # between 0 and q-1)
+        a = (a + context.half_q) & context.mask_q_a
+        # And then mod 3 (see NTRU_decryption_context)
+        for k, mask_low, mask_high in context.mod3_steps:
+            a = (a & mask_low) + ((a >> k) & mask_high)
+        a = a - 3 * (((a + fields.ones) & context.fours) >> 2)
+
+        # Compute M = A*F_inv mod 3 (moving A to the narrower fields that
+        # product uses first).  As we hold A + q/2, the product is q/2 * (1 +
+        # x + ... + x^(n-1)) * F_inv too large; every coefficient of that is
+        # q/2 times the sum of the coefficients of F_inv, so we add adjust_3
+        # (which is minus that, mod 3) to every coefficient
+        a = kronecker_resize(a, n, fields.size, context.fields_m.size)
+        fields = context.fields_m
+        M = fields.unpack(fields.fold(a * context.F_inv3))
+        if self.hrss:
+            # We have V = M/(x-1); reduce that mod (x^n-1)/(x-1), as lift
+            # does (which also cancels adjust_3, as it was added to V[n-1]
+            # too), and multiply it by x-1 to get lift(M)
+            last = M[n-1]
+            V = [(v - last + 1) % 3 - 1 for v in M]     # Balanced
+            L = [a - b for a, b in zip(V[-1:] + V[:-1], V)]
+            # M itself is that reduced mod 3 and (x^n-1)/(x-1)
+            last = L[n-1]
+            M = [(v - last) % 3 for v in L]     # With -1 as 2
+        else:
+            M = [(v + context.adjust_3) % 3 for v in M]
+
+        # Check M, as check_m does (all the coefficients are trinary, so
+        # this is just counting them)
+        if self.hrss:
+            failure_flag = 0    # M is trinary, with the last coefficient 0
+        else:
+            failure_flag = M[n-1] | (M.count(1) - (self.q//16 - 1)) | \
+                                    (M.count(2) - (self.q//16 - 1))
+
+        # Compute E = C - lift(M) + offset, which keeps every coefficient
+        # nonnegative
+        if self.hrss:
+            E = [2 - x for x in L]
+        else:
+            E = [(1, 0, 2)[v] for v in M]       # 1 - M (with -1 as 2)
+        fields = context.fields_r
+        ones = fields.ones
+        e = fields.pack(C) + fields.pack(E)
+
+        # Compute R = (C - lift(M))*H_inv mod q.  That's E*H_inv less
+        # offset times H_inv*(1 + x + ... + x^(n-1)); so, as above, we add
+        # adjust_q to every coefficient
+        r = fields.fold(e * context.H_invq)
+        r = (r + context.adjust_q * ones) & context.mask_q_r
+        # Reduce R mod (x^n-1)/(x-1), by subtracting the last coefficient
+        # from every coefficient
+        last = r >> (fields.shift - fields.width)
+        r = (r + (q - last) * ones) & context.mask_q_r
+
+        # R is legal if every coefficient is -1, 0 or 1 (q-1, 0 or 1 as we
+        # hold them); that is, if R+1 has every coefficient 0, 1 or 2.  Then,
+        # adding 1 again, we have a value less than 4 in each field if, and
+        # only if, R was legal
+        r = (r + ones) & context.mask_q_r
+        bad = (r + ones) & context.high_bits
+        # (turn that into 1 if any field was bad, 0 if none were)
+        bad = ((bad | -bad) >> fields.shift) & 1
+        failure_flag = failure_flag | bad
+
+        # And R (we hold R+1; adding 2 more gives R+3, which is the same
+        # thing, mod 3)
+        R = fields.unpack(r + 2*ones)
+
+        return (R,M,failure_flag)
+ 
+    #
+    # This encodes the private key into a byte string, in the layout the
+    # draft uses:
+    #   pack_S3(F) || pack_S3(F_inv) || pack_Sq(H_inv) || S
+    # where pack_Sq is pack_Rq0, for a polynomial whose last coefficient is
+    # 0 (key_gen makes sure F_inv and H_inv are reduced that way).  The
+    # public key isn't part of it
+    def pack_private_key(self):
+        buffer = bytearray(self.packed_private_key_bytes)
+        offset = self.pack_S3_into(self.F, buffer)
+        offset += self.pack_S3_into(self.F_inv, buffer, offset)
+        offset += self.pack_Rq0_into(self.H_inv, buffer, offset)
+        buffer[offset:] = self.S
+        return buffer
+
+    # And this does the reverse, replacing the key we hold with the one
+    # encoded in list (at offset); as with the other unpack routines, list
+    # may be any bytes-like object, and isn't copied.  If we're also given
+    # the (packed) public key, we unpack that into H; otherwise, H is None
+    def unpack_private_key(self, list, offset=0, public_key=None):
+        data = memoryview(list)[offset:offset+self.packed_private_key_bytes]
+        if len(data) != self.packed_private_key_bytes:
+            raise ValueError    # Too short to be a private key
+        S3_bytes = self.packed_S3_bytes
+        self.F = self.polynomial(self.unpack_S3(data, 0), 3)
+        self.F_inv = self.polynomial(self.unpack_S3(data, S3_bytes), 3)
+        H_inv = self.unpack_Rq0(data, 2*S3_bytes)
+        H_inv[self.n-1] = 0     # (rather than what unpack_Rq0 reconstructs)
+        self.H_inv = self.polynomial(H_inv)
+        self.S = bytearray(data[-32:])
+        self.H = None
+        if public_key is not None:
+            self.H = self.polynomial(self.unpack_Rq0(public_key))
+        self.precompute()
+
+    # Write the encoded private key to the file path, and read it back
+    def save(self, path):
+        with open(path, 'wb') as file:
+            file.write(self.pack_private_key())
+
+    def load(self, path, public_key=None):
+        with open(path, 'rb') as file:
+            self.unpack_private_key(file.read(), 0, public_key)
+
+    #
+    # This is the KEM decapsulate routine; it is passed the key share and
+    # returns a shared secret (either the valid one, or an error one)
+    def kem_decapsulate(self, C_packed):
+
+        if self.fused_decrypt:
+            # Recover the R, M values (and whether the decryption suceeded)
+            # directly from the packed ciphertext
+            (R, M, failure_flag) = self.decrypt_fused(C_packed)
+        else:
+            # Recover the ciphertext that the encryptor sent
+            C = self.unpack_Rq0(C_packed)
+
+            # Recover the R, M values (and whether the decryption suceeded)
+            (R, M, failure_flag) = self.decrypt(C)
+
+        # Hash the R, M values together (which will be the same shared secret
+        # that the encryptor selected on a valid encryption)
+        K1 = self.hash_two_trinary_polynomials(R, M)
+
+        # Hash the ciphertext and a random value; this is a random looking
+        # string that we return on decryption failure.  And, since this
+        # depends only on the ciphertext, we'll always get the same random
+        # string even if they submit the same ciphertext
+        K2 = self.decoy_hash(C_packed)
+
+        # On success, return the real shared secret.  On failure, return the
+        # decoy.
+        # This code sets result to K1 on success, K2 on failure; rather than
+        # select a byte at a time, we treat each of the two as one 256 bit
+        # integer, and select between them with a mask which is all ones on
+        # failure, and all zeros on success
+        failure_flag = failure_flag | -failure_flag  # Bit 15 set on failure
+        bad_mul = (failure_flag >> 15) & 1  # 1 on failure, 0 on success
+        K1 = int.from_bytes(K1, 'little')
+        K2 = int.from_bytes(K2, 'little')
+        result = K1 ^ ((K1 ^ K2) & -bad_mul)
+
+        return bytearray(result.to_bytes(32, 'little'))
+
+    #
+    # This is the batched KEM decapsulate routine; it is passed a list of
+    # key shares, and returns the list of shared secrets, just as if we had
+    # called kem_decapsulate on each one
+    # With the numpy arithmetic, the ciphertexts are handled as a matrix
+    # whose rows are polynomials; decrypt works on that directly, and so
+    # each of its multiplies (and the checks) is one step for the batch
+    def kem_decapsulate_many(self, C_packed):
+        if not self.use_numpy:
+            return [self.kem_decapsulate(C) for C in C_packed]
+        if not C_packed:
+            return []       # (the matrices below need at least one row)
+
+        C = self.unpack_Rq0_many(C_packed)
+        (R, M, failure_flag) = self.decrypt(C)
+
+        # The real shared secrets, and the decoys
+        K1 = numpy.frombuffer(b''.join(
+                 self.hash_two_trinary_polynomials_many(R, M)),
+                 dtype=numpy.uint8).reshape(len(C_packed), 32)
+        K2 = numpy.frombuffer(b''.join(
+                 self.decoy_hash(C) for C in C_packed),
+                 dtype=numpy.uint8).reshape(len(C_packed), 32)
+
+        # And select between them, as kem_decapsulate does, for all the rows
+        failure_flag = failure_flag | -failure_flag
+        bad_mul = ((failure_flag >> 15) & 1)[:, None]
+        good_mul = 1-bad_mul
+        result = (good_mul*K1 + bad_mul*K2).astype(numpy.uint8)
+        return [bytearray(row.tobytes()) for row in result]
+
+#
+# The parameter sets we support (other than 'tiny'), smallest first
+parameter_sets = ['hps2048509', 'hps2048677', 'hrss701', 'hps4096821',
+                  'hps40961229', 'hrss1373']
@@ -0,0 +1,418 @@
+#
+# A local NTRU server, for programs that can't (or would rather not) run
+# this package themselves
+import os         # To fork the workers
+import signal     # To stop the workers
+import socket     # For the Unix domain socket
+import struct     # For the request and response framing
+import selectors  # Each worker serves many connections at once
+from .core import NTRU_publickey
+from .aio import run_batch
+
+#
+# NTRU_daemon loads a set of keys once, and then forks worker processes that
+# serve encapsulation and decapsulation requests for them over a Unix
+# domain socket.  The workers get the keys (already decoded, with their
+# decryption tables worked out; see warm) from the parent, in memory the
+# operating system shares between them until someone writes to it; so
+# however many workers and clients there are, the keys are loaded once, and
+# no client pays for starting Python or decoding a key
+#
+# The keys are either an NTRU_keystore (see keystore.py), or a list of
+# (NTRU_privatekey, packed public key) pairs (as NTRU_keypool and
+# key_gen_many give them); each is known by its index in that list
+#
+# The workers all accept connections on the one listening socket, and each
+# worker serves any number of connections.  A client may send any number of
+# requests without waiting for the responses ('pipelining'); each time
+# round its loop, a worker reads whatever requests have arrived on all its
+# connections, runs them in batches (the ones for the same operation and key
+# together, up to max_batch at a time; with the numpy arithmetic, each batch
+# is one call to kem_decapsulate_many or kem_encapsulate_many), and sends
+# each connection its responses, in the order it sent the requests
+#
+# A request is
+#   operation     1 byte (see the daemon_ values below)
+#   key index     4 bytes
+#   request id    4 bytes (anything the client likes; echoed back)
+#   length        4 bytes (of the payload)
+#   payload
+# and a response is
+#   status        1 byte (0 for success; see the status_ values below)
+#   request id    4 bytes (from the request)
+#   length        4 bytes (of the payload)
+#   payload
+# with all the numbers big endian.  The operations are:
+#   daemon_public_key    the payload is empty; the response is the key's
+#                        packed public key
+#   daemon_encapsulate   the payload is a packed public key, or empty (for
+#                        the key's own public key); the response is the
+#                        ciphertext followed by the 32 byte shared secret
+#   daemon_decapsulate   the payload is a ciphertext; the response is the
+#                        shared secret
+request_header = struct.Struct('>BIII')
+response_header = struct.Struct('>BII')
+daemon_public_key = 1
+daemon_encapsulate = 2
+daemon_decapsulate = 3
+status_ok = 0
+status_bad_request = 1      # Unknown operation, or the wrong payload size
+status_bad_key = 2          # There's no key with that index
+status_failed = 3           # The operation raised an exception
+max_payload = 65536         # Anything bigger can't be a valid request; we
+                            # drop the connection
+max_pending = 1 << 20       # The most response bytes we'll hold for a
+                            # connection before we stop reading its requests
+
+class NTRU_daemon:
+    #
+    # Serve the keys on the Unix domain socket path, with 'workers' worker
+    # processes (by default, one per processor).  Any extra keyword
+    # arguments are passed to NTRU_publickey (and, with a key store, to
+    # NTRU_privatekey; for example, multiply_backend or arithmetic)
+    # Call serve_forever() to start the workers (and wait for them); or
+    # start() to just start them, and close() to stop them
+    def __init__(self, path, keys, workers=None, max_batch=32, **options):
+        if max_batch < 1:
+            raise ValueError    # We need to run at least one at a time
+        if hasattr(keys, 'private_key'):
+            # A key store; decode every key now, so that the workers share
+            # the decoded keys, rather than each decoding its own
+            self.keys = [(keys.private_key(index),
+                          bytes(keys.public_key(index)))
+                         for index in range(len(keys))]
+            parameter_set = keys.parameter_set
+            options = dict(keys.options, **options)
+        else:
+            self.keys = [(key, bytes(public_key)) for key, public_key in keys]
+            if not self.keys:
+                raise ValueError    # No keys to serve
+            parameter_set = self.keys[0][0].parameter_set
+        for key, public_key in self.keys:
+            if key.parameter_set != parameter_set:
+                raise ValueError    # The keys aren't all for one
+                                    # parameter set
+            warm(key)
+        self.ntru = NTRU_publickey(parameter_set, **options)
+        self.ntru.public_key_cache_size = max(self.ntru.public_key_cache_size,
+                                              len(self.keys))
+        for _, public_key in self.keys:
+            self.ntru.prepare_public_key(public_key)
+        self.path = path
+        self.workers = workers or os.cpu_count()
+        self.max_batch = max_batch
+        self.listener = None
+        self.children = []      # The worker processes' pids
+
+    def start(self):
+        # Create the socket, and fork the workers
+        if os.path.exists(self.path):
+            os.unlink(self.path)    # (left over from an earlier run)
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.path)
+        self.listener.listen(128)
+        self.listener.setblocking(False)
+        for _ in range(self.workers):
+            self.fork()
+
+    def fork(self):
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                self.worker()
+            except BaseException:
+                status = 1
+            finally:
+                os._exit(status)
+        self.children.append(pid)
+
+    def serve_forever(self):
+        # Start the workers, and replace any that die; until we get SIGTERM
+        # (or SIGINT), when we stop them all
+        def stop(signum, frame):
+            raise KeyboardInterrupt
+        signal.signal(signal.SIGTERM, stop)
+        if self.listener is None:
+            self.start()
+        try:
+            while True:
+                pid, _ = os.wait()
+                if pid in self.children:
+                    self.children.remove(pid)
+                    self.fork()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        # Stop the workers, and remove the socket
+        for pid in self.children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in self.children:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        self.children = []
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    #
+    # What each worker runs
+    def worker(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self.listener, selectors.EVENT_READ)
+        connections = {}        # The NTRU_connection for each socket
+        while True:
+            requests = []
+            for selected, events in selector.select():
+                if selected.fileobj is self.listener:
+                    self.accept(selector, connections)
+                    continue
+                connection = connections[selected.fileobj]
+                if events & selectors.EVENT_WRITE:
+                    connection.send()
+                if events & selectors.EVENT_READ:
+                    connection.receive()
+                    requests.extend(connection.requests())
+            if requests:
+                self.run(requests)
+            for connection in list(connections.values()):
+                connection.send()
+                if connection.closed:
+                    selector.unregister(connection.socket)
+                    connection.socket.close()
+                    del connections[connection.socket]
+                else:
+                    selector.modify(connection.socket, connection.events())
+
+    def accept(self, selector, connections):
+        # Accept whatever connections are waiting (the other workers are
+        # trying to as well, so there may be none left by now)
+        while True:
+            try:
+                sock, _ = self.listener.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            sock.setblocking(False)
+            connection = NTRU_connection(sock)
+            connections[sock] = connection
+            selector.register(sock, connection.events())
+
+    def run(self, requests):
+        # Run the requests (a list of (connection, operation, index, id,
+        # payload)), and queue each response on its connection, in the same
+        # order
+        responses = [None] * len(requests)
+        batches = {}        # The positions of the requests to batch, by
+                            # (operation, index)
+        for position, (_, operation, index, _, payload) in \
+                enumerate(requests):
+            if not 0 <= index < len(self.keys):
+                responses[position] = (status_bad_key, b'')
+            elif operation == daemon_public_key and not payload:
+                responses[position] = (status_ok, self.keys[index][1])
+            elif operation in (daemon_encapsulate, daemon_decapsulate):
+                batches.setdefault((operation, index), []).append(position)
+            else:
+                responses[position] = (status_bad_request, b'')
+        for (operation, index), positions in batches.items():
+            key, public_key = self.keys[index]
+            for start in range(0, len(positions), self.max_batch):
+                chunk = positions[start:start+self.max_batch]
+                payloads = [requests[position][4] for position in chunk]
+                for position, response in zip(chunk, self.batch(
+                        operation, key, public_key, payloads)):
+                    responses[position] = response
+        for (connection, _, _, id, _), (status, payload) in \
+                zip(requests, responses):
+            connection.respond(status, id, payload)
+
+    def batch(self, operation, key, public_key, payloads):
+        # Run one batch of operation, for key (whose public key is
+        # public_key); return the (status, payload) for each
+        if operation == daemon_encapsulate:
+            size = len(public_key)
+            arguments = [payload or public_key for payload in payloads]
+            ntru, name = self.ntru, 'kem_encapsulate'
+        else:
+            size = key.packed_Rq0_bytes
+            arguments = payloads
+            ntru, name = key, 'kem_decapsulate'
+        results = [(status_bad_request, b'')] * len(arguments)
+        valid = [i for i, argument in enumerate(arguments)
+                 if len(argument) == size]
+        try:
+            done = run_batch(ntru, name, [arguments[i] for i in valid])
+        except Exception:
+            done = [None] * len(valid)
+        for i, result in zip(valid, done):
+            if result is None:
+                results[i] = (status_failed, b'')
+            elif operation == daemon_encapsulate:
+                results[i] = (status_ok, bytes(result[0]) + bytes(result[1]))
+            else:
+                results[i] = (status_ok, bytes(result))
+        return results
+
+def warm(key):
+    # Do everything a private key works out the first time it is used, so
+    # that the workers inherit it rather than each doing it
+    key.precompute()
+
+class NTRU_connection:
+    #
+    # One client connection, in a worker: the bytes we've read but not yet
+    # made into requests, and the responses we haven't sent yet
+    def __init__(self, sock):
+        self.socket = sock
+        self.incoming = bytearray()
+        self.outgoing = bytearray()
+        self.closed = False
+        self.eof = False        # The client has finished sending
+
+    def events(self):
+        events = 0
+        if not self.eof and len(self.outgoing) < max_pending:
+            events = selectors.EVENT_READ
+        if self.outgoing:
+            events = events | selectors.EVENT_WRITE
+        return events or selectors.EVENT_READ
+
+    def receive(self):
+        try:
+            data = self.socket.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self.closed = True
+            return
+        if not data:
+            self.eof = True
+        self.incoming += data
+
+    def requests(self):
+        # Return the complete requests we've read (and drop them from
+        # incoming), as (connection, operation, index, id, payload)
+        requests = []
+        offset = 0
+        size = request_header.size
+        while len(self.incoming) - offset >= size:
+            operation, index, id, length = \
+                request_header.unpack_from(self.incoming, offset)
+            if length > max_payload:
+                self.closed = True      # Not something we understand
+                break
+            if len(self.incoming) - offset - size < length:
+                break
+            payload = bytes(self.incoming[offset+size:offset+size+length])
+            requests.append((self, operation, index, id, payload))
+            offset = offset + size + length
+        del self.incoming[:offset]
+        return requests
+
+    def respond(self, status, id, payload):
+        self.outgoing += response_header.pack(status, id, len(payload))
+        self.outgoing += payload
+
+    def send(self):
+        if self.outgoing and not self.closed:
+            try:
+                sent = self.socket.send(self.outgoing)
+                del self.outgoing[:sent]
+            except (BlockingIOError, InterruptedError):
+                pass
+            except OSError:
+                self.closed = True
+        if self.eof and not self.outgoing:
+            self.closed = True
+
+#
+# A client for the daemon (for Python programs, and for testing; the point
+# of the framing is that clients in other languages are just as easy)
+class NTRU_daemon_client:
+    def __init__(self, path):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(path)
+        self.file = self.socket.makefile('rb')
+        self.next_id = 0
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def send(self, operation, index, payload=b''):
+        # Send a request, and return its id (we don't wait for the response)
+        id = self.next_id
+        self.next_id = (self.next_id + 1) & 0xffffffff
+        self.socket.sendall(request_header.pack(operation, index, id,
+                                                len(payload)) + payload)
+        return id
+
+    def receive(self):
+        # Read the next response, and return (status, id, payload)
+        header = self.file.read(response_header.size)
+        if len(header) != response_header.size:
+            raise ConnectionError('the NTRU daemon closed the connection')
+        status, id, length = response_header.unpack(header)
+        payload = self.file.read(length)
+        if len(payload) != length:
+            raise ConnectionError('the NTRU daemon closed the connection')
+        return status, id, payload
+
+    def call(self, operation, index, payload=b''):
+        self.send(operation, index, payload)
+        status, _, payload = self.receive()
+        if status != status_ok:
+            raise ValueError('NTRU daemon request failed (status %d)' %
+                             status)
+        return payload
+
+    def public_key(self, index=0):
+        return self.call(daemon_public_key, index)
+
+    def kem_encapsulate(self, index=0, public_key=b''):
+        # Returns the ciphertext and the shared secret
+        result = self.call(daemon_encapsulate, index, public_key)
+        return result[:-32], result[-32:]
+
+    def kem_decapsulate(self, C_packed, index=0):
+        return self.call(daemon_decapsulate, index, bytes(C_packed))
+
+    def kem_decapsulate_many(self, C_packed, index=0):
+        # Decapsulate each of the ciphertexts, sending all the requests
+        # before reading any responses (so that the daemon can run them as
+        # a batch)
+        for C in C_packed:
+            self.send(daemon_decapsulate, index, bytes(C))
+        results = []
+        for _ in C_packed:
+            status, _, payload = self.receive()
+            if status != status_ok:
+                raise ValueError('NTRU daemon request failed (status %d)' %
+                                 status)
+            results.append(payload)
+        return results
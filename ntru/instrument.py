@@ -0,0 +1,328 @@
+#
+# Finding out where the time goes inside the NTRU operations
+import os         # To replace a metrics file in one step
+import time       # To time things
+import types      # To find the methods we can instrument
+import pstats     # To report what cProfile found
+import cProfile   # For the sampled profiles
+import logging    # For the logging sink
+import threading  # Each thread has its own stack of phases
+import tracemalloc      # For the sampled memory use
+from .core import NTRU_base
+
+#
+# The benchmarks (bench.py) tell us how long each operation takes, but not
+# what it spends that time on.  NTRU_instrumentation does: given an NTRU
+# object (an NTRU_base, NTRU_publickey or NTRU_privatekey), it replaces each
+# of that object's methods (the public ones, like kem_decapsulate, and the
+# internal ones, like unpack_Rq0, multiply, mod_phin and check_r) with a
+# version that times the call, and records it against the 'phase' it
+# belongs to.  A phase is the method's name, prefixed by the phases it was
+# called from; so the multiplies decrypt does show up as
+# 'kem_decapsulate/decrypt/multiply', separately from the one in
+# 'kem_encapsulate/encrypt/multiply'
+#
+# The replacement methods are only set on the object we're given (the class
+# isn't touched), and detach() removes them again; so an object that isn't
+# being instrumented runs exactly the code it always did, at no cost at all
+# Nor are they passed on to copies (or pickles) of the object: the keys
+# key_gen_many returns, for one, aren't instrumented
+#
+# For each phase, we record:
+#   count      how many calls there were
+#   wall       their total (wall clock) time, in seconds
+#   cpu        the processor time the calling thread spent on them
+#   self       the part of the wall time not spent in instrumented methods
+#              they called (so the 'self' times add up to the total)
+#   buckets    a histogram of the wall time of each call: how many calls
+#              took no longer than each of phase_buckets (and, last, how
+#              many took longer than all of them)
+#
+# export() hands these to a sink, which is any function taking the dict
+# snapshot() returns (from phase to those values); logging_sink and
+# prometheus_sink give us two, or you can pass your own
+#
+# sample() also runs the next few calls of the operations you choose under
+# cProfile and tracemalloc, for when the phases aren't detailed enough
+phase_buckets = (0.00001, 0.00003, 0.0001, 0.0003, 0.001, 0.003, 0.01,
+                 0.03, 0.1, 0.3, 1.0)
+
+#
+# The methods we leave alone by default: modq is called once per
+# coefficient, and timing each of those calls would cost far more than the
+# call itself (and so swamp the figures for whatever called it)
+uninstrumented_methods = ('modq',)
+
+def instrumented_methods(ntru):
+    # Return the names of the methods of ntru (an NTRU_base or subclass) that
+    # we instrument: everything its classes define, from NTRU_base on, other
+    # than the special (__name__) methods and uninstrumented_methods
+    names = list(uninstrumented_methods)
+    for cls in type(ntru).__mro__:
+        if not issubclass(cls, NTRU_base):
+            continue
+        for name, value in vars(cls).items():
+            if isinstance(value, types.FunctionType) and \
+                    not name.startswith('__') and name not in names:
+                names.append(name)
+    return names[len(uninstrumented_methods):]
+
+class NTRU_phase:
+    #
+    # What we've recorded for one phase
+    __slots__ = ('count', 'wall', 'cpu', 'self', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.self = 0.0
+        self.buckets = [0] * (len(phase_buckets) + 1)
+
+    def add(self, wall, cpu, own):
+        self.count = self.count + 1
+        self.wall = self.wall + wall
+        self.cpu = self.cpu + cpu
+        self.self = self.self + own
+        bucket = 0
+        while bucket < len(phase_buckets) and wall > phase_buckets[bucket]:
+            bucket = bucket + 1
+        self.buckets[bucket] = self.buckets[bucket] + 1
+
+    def summary(self):
+        return {'count': self.count, 'wall': self.wall, 'cpu': self.cpu,
+                'self': self.self, 'buckets': list(self.buckets)}
+
+class NTRU_instrumentation:
+    #
+    # Instrument the NTRU object ntru.  sink is where export() sends the
+    # figures (None to only keep them); methods is the list of method names
+    # to instrument (by default, all of them; see instrumented_methods).  If
+    # nested is false, each phase is just the method's name, whatever it was
+    # called from
+    #
+    # This can also be used as a context manager, which detaches itself
+    # (after exporting what it has) at the end
+
+    def __init__(self, ntru, sink=None, methods=None, nested=True):
+        self.ntru = ntru
+        self.sink = sink
+        self.nested = nested
+        self.phases = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()  # The stack of phases we're in
+
+        # The sampled profiles (see sample)
+        self.sample_operations = ()
+        self.sample_remaining = 0
+        self.sample_memory = False
+        self.sample_lock = threading.Lock()
+        self.profiler = None
+        self.memory = []        # Peak bytes allocated by each sampled call
+
+        self.methods = []
+        for name in methods or instrumented_methods(ntru):
+            if name in vars(ntru):
+                raise ValueError    # Already instrumented (or overridden)
+            setattr(ntru, name, self.wrap(name, getattr(ntru, name)))
+            self.methods.append(name)
+
+    def detach(self):
+        # Put ntru's own methods back
+        for name in self.methods:
+            delattr(self.ntru, name)
+        self.methods = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.detach()
+        if self.sink is not None:
+            self.export()
+
+    def wrap(self, name, method):
+        # Return the timed version of method (which is called name)
+        local = self.local
+        def timed(*args, **kwargs):
+            stack = getattr(local, 'stack', None)
+            if stack is None:
+                stack = local.stack = []
+            if stack and self.nested:
+                phase = stack[-1][0] + '/' + name
+            else:
+                phase = name
+            sample = not stack and name in self.sample_operations
+            stack.append([phase, 0.0])  # The phase, and the time spent in
+                                        # the instrumented methods it calls
+            if sample:
+                return self.sampled(method, args, kwargs)
+            return self.run(method, args, kwargs)
+        timed.__wrapped__ = method
+        return timed
+
+    def run(self, method, args, kwargs):
+        # Call method, timing it against the phase on top of the stack
+        stack = self.local.stack
+        cpu = time.thread_time()
+        wall = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.thread_time() - cpu
+            phase, inner = stack.pop()
+            if stack:
+                stack[-1][1] = stack[-1][1] + wall
+            self.record(phase, wall, cpu, wall - inner)
+
+    def record(self, phase, wall, cpu, own):
+        with self.lock:
+            figures = self.phases.get(phase)
+            if figures is None:
+                figures = self.phases[phase] = NTRU_phase()
+            figures.add(wall, cpu, own)
+
+    #
+    # The sampled profiles.  sample(calls, operations) profiles the next
+    # 'calls' calls (between them) of the methods named in operations, when
+    # they are called from outside the NTRU object (that is, not as part of
+    # some other instrumented method); by default, the KEM operations.  The
+    # calls are timed as usual too, although the profiling slows them down
+    # With memory set, we also trace the memory each of those calls
+    # allocates (tracemalloc), and add its peak to the list self.memory
+    # profile() returns the pstats.Stats for all the calls profiled so far
+    # (or None, if there haven't been any)
+    # Only one thread is profiled at a time; a call that comes in while
+    # another thread is being profiled is just timed
+    def sample(self, calls, operations=('key_gen', 'kem_encapsulate',
+                                        'kem_decapsulate'), memory=True):
+        for name in operations:
+            if name not in self.methods:
+                raise ValueError    # We're not instrumenting that method
+        self.sample_memory = memory
+        self.sample_remaining = calls
+        self.sample_operations = tuple(operations) if calls > 0 else ()
+
+    def sampled(self, method, args, kwargs):
+        # Run (and time) a call that sample() asked us to profile
+        if not self.sample_lock.acquire(blocking=False):
+            return self.run(method, args, kwargs)
+        try:
+            if self.sample_remaining <= 0:
+                self.sample_operations = ()
+                return self.run(method, args, kwargs)
+            self.sample_remaining = self.sample_remaining - 1
+            if self.sample_remaining <= 0:
+                self.sample_operations = ()
+            if self.profiler is None:
+                self.profiler = cProfile.Profile()
+            memory = self.sample_memory
+            if memory:
+                tracing = tracemalloc.is_tracing()
+                if not tracing:
+                    tracemalloc.start()
+                tracemalloc.reset_peak()
+                before, _ = tracemalloc.get_traced_memory()
+            self.profiler.enable()
+            try:
+                return self.run(method, args, kwargs)
+            finally:
+                self.profiler.disable()
+                if memory:
+                    _, peak = tracemalloc.get_traced_memory()
+                    if not tracing:
+                        tracemalloc.stop()
+                    self.memory.append(peak - before)
+        finally:
+            self.sample_lock.release()
+
+    def profile(self):
+        if self.profiler is None:
+            return None
+        return pstats.Stats(self.profiler)
+
+    #
+    # Getting the figures out
+    def snapshot(self):
+        # Return what we've recorded so far, as a dict from each phase to a
+        # dict of the values NTRU_phase keeps
+        with self.lock:
+            return {phase: figures.summary()
+                    for phase, figures in self.phases.items()}
+
+    def reset(self):
+        with self.lock:
+            self.phases = {}
+
+    def export(self, sink=None):
+        # Send the current figures to sink (by default, the one we were
+        # given), and return them
+        snapshot = self.snapshot()
+        sink = sink or self.sink
+        if sink is None:
+            raise ValueError    # Nowhere to send them
+        sink(snapshot)
+        return snapshot
+
+#
+# The sinks
+def format_phases(snapshot):
+    # Format a snapshot as a table (a string), slowest phase first
+    lines = ['%-48s %8s %11s %11s %11s %9s' %
+             ('phase', 'calls', 'wall ms', 'cpu ms', 'self ms', 'mean us')]
+    for phase, figures in sorted(snapshot.items(),
+                                 key=lambda item: -item[1]['wall']):
+        lines.append('%-48s %8d %11.3f %11.3f %11.3f %9.1f' %
+                     (phase, figures['count'], 1000 * figures['wall'],
+                      1000 * figures['cpu'], 1000 * figures['self'],
+                      1e6 * figures['wall'] / figures['count']))
+    return '\n'.join(lines)
+
+def logging_sink(logger=None, level=logging.INFO):
+    # Return a sink that logs each phase (one line each) to logger (by
+    # default, the 'ntru' logger)
+    logger = logger or logging.getLogger('ntru')
+    def sink(snapshot):
+        for phase, figures in snapshot.items():
+            logger.log(level, 'ntru phase %s: %d calls, wall %.6fs, '
+                       'cpu %.6fs, self %.6fs', phase, figures['count'],
+                       figures['wall'], figures['cpu'], figures['self'])
+    return sink
+
+def prometheus_text(snapshot, prefix='ntru'):
+    # Format a snapshot in the Prometheus text exposition format: the wall
+    # times as a histogram, and the processor and self times as counters,
+    # each labelled with the phase
+    lines = ['# TYPE %s_phase_seconds histogram' % prefix]
+    for phase, figures in snapshot.items():
+        label = 'phase="%s"' % phase
+        total = 0
+        for bound, count in zip(phase_buckets + ('+Inf',),
+                                figures['buckets']):
+            total = total + count
+            lines.append('%s_phase_seconds_bucket{%s,le="%s"} %d' %
+                         (prefix, label, bound, total))
+        lines.append('%s_phase_seconds_sum{%s} %r' %
+                     (prefix, label, figures['wall']))
+        lines.append('%s_phase_seconds_count{%s} %d' %
+                     (prefix, label, figures['count']))
+    for name, key in (('cpu', 'cpu'), ('self', 'self')):
+        lines.append('# TYPE %s_phase_%s_seconds_total counter' %
+                     (prefix, name))
+        for phase, figures in snapshot.items():
+            lines.append('%s_phase_%s_seconds_total{phase="%s"} %r' %
+                         (prefix, name, phase, figures[key]))
+    return '\n'.join(lines) + '\n'
+
+def prometheus_sink(path, prefix='ntru'):
+    # Return a sink that writes prometheus_text to the file path (say, for
+    # a node exporter's text file collector to pick up); as with the key
+    # store, we write a new file and rename it over the old one, so that
+    # whoever reads it never sees half of it
+    def sink(snapshot):
+        temporary = path + '.tmp'
+        with open(temporary, 'w') as file:
+            file.write(prometheus_text(snapshot, prefix))
+        os.replace(temporary, path)
+    return sink
@@ -0,0 +1,199 @@
+#
+# A pool of NTRU keys generated ahead of time, in the background
+import os         # To find out how many processors we have
+import time       # To measure how fast the key pool refills
+import threading  # To let the key pool refill in the background
+import collections      # For the key pool's queue of ready keys
+import multiprocessing  # To generate keys on all the processors at once
+import pickle     # To check that the workers can be given the options
+from .core import NTRU_base, NTRU_privatekey
+
+#
+# Key generation is by far the most expensive NTRU operation.  An
+# application that wants a new key for each connection can't afford to
+# generate it while the connection waits; instead, it can keep a pool of
+# keys that were generated ahead of time, by worker processes running on
+# all the processors, and just take one when it needs it
+
+def generate_keypair(parameter_set, options):
+    # Generate one keypair; this is what the key pool's worker processes run
+    # It returns the private key object (which holds everything needed to
+    # decapsulate), along with the public key
+    private_key = NTRU_privatekey(parameter_set, **options)
+    public_key = private_key.key_gen()
+    return private_key, public_key
+
+class NTRU_keypool:
+    #
+    # This keeps a bounded queue of ready keypairs, filled by a pool of
+    # worker processes.  Whenever the number of ready (or in progress) keys
+    # drops to low_water, we start generating enough keys to bring it back
+    # up to high_water
+    #
+    # Any extra keyword arguments are passed to NTRU_privatekey (for
+    # example, multiply_backend or arithmetic)
+    #
+    # If max_failures keypairs in a row fail to generate, something is
+    # wrong that trying again won't fix; we stop generating keys, and
+    # get_keypair raises the last error (once the keys that are ready have
+    # been used up), rather than waiting for keys that will never come
+
+    def __init__(self, parameter_set, low_water=16, high_water=64,
+                 processes=None, max_failures=8, **options):
+        if not 0 <= low_water < high_water:
+            raise ValueError    # The watermarks make no sense
+        if max_failures < 1:
+            raise ValueError    # We need to allow at least one try
+        self.parameter_set = parameter_set
+        self.options = options
+        self.low_water = low_water
+        self.high_water = high_water
+        NTRU_base(parameter_set, **options)  # Check the parameters now,
+                                             # rather than in the workers
+        pickle.dumps(options)   # And that we can send them to the workers
+                                # (a seeded DRBG, for one, can't be)
+        self.workers = multiprocessing.Pool(processes or os.cpu_count())
+        self.ready = collections.deque()    # The keypairs waiting to be used
+        self.pending = 0                    # The keypairs being generated
+        self.lock = threading.Condition()
+        self.error = None                   # The last error from a worker
+        self.max_failures = max_failures
+        self.failures = 0                   # Failures since the last success
+        self.closed = False
+
+        # Statistics
+        self.started = time.monotonic()
+        self.generated = 0      # Keypairs the workers have finished
+        self.served = 0         # Keypairs we've handed out
+        self.misses = 0         # try_get_keypair calls that found nothing
+        self.errors = 0         # Keypairs that failed to generate
+        self.recent = collections.deque(maxlen=high_water)
+                                # When the most recent keypairs finished
+
+        with self.lock:
+            self.refill()
+
+    def refill(self):
+        # Start generating more keys, if we've dropped to the low water mark
+        # The caller must hold the lock
+        if self.closed or self.failing():
+            return
+        have = len(self.ready) + self.pending
+        if have > self.low_water:
+            return
+        for _ in range(self.high_water - have):
+            self.pending = self.pending + 1
+            self.workers.apply_async(generate_keypair,
+                                     (self.parameter_set, self.options),
+                                     callback=self.finished,
+                                     error_callback=self.failed)
+
+    def finished(self, keypair):
+        # A worker has finished a keypair (this is called on a thread that
+        # the multiprocessing pool runs for us)
+        with self.lock:
+            self.pending = self.pending - 1
+            self.generated = self.generated + 1
+            self.failures = 0
+            self.recent.append(time.monotonic())
+            self.ready.append(keypair)
+            self.lock.notify()
+
+    def failed(self, error):
+        # A worker failed to generate a keypair; remember why (so that
+        # get_keypair can report it, rather than waiting forever), and try
+        # again (unless that's max_failures in a row; see failing)
+        with self.lock:
+            self.pending = self.pending - 1
+            self.errors = self.errors + 1
+            self.failures = self.failures + 1
+            self.error = error
+            self.lock.notify_all()
+            self.refill()
+
+    def failing(self):
+        # Whether we've given up on generating keys: the last max_failures
+        # attempts all failed.  The caller must hold the lock
+        return self.failures >= self.max_failures
+
+    def get_keypair(self, timeout=None):
+        # Return a (private_key, public_key) pair, waiting for one to be
+        # generated if the pool is empty.  If timeout (in seconds) expires
+        # first, this raises TimeoutError; if the workers keep failing (see
+        # failing), this raises the last error they gave
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.lock:
+            while not self.ready:
+                if self.closed:
+                    raise ValueError('key pool is closed')
+                if self.error is not None and (self.pending == 0 or
+                                               self.failing()):
+                    raise self.error
+                self.refill()
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError
+                self.lock.wait(remaining)
+            return self.take()
+
+    def try_get_keypair(self):
+        # Return a (private_key, public_key) pair if one is ready; otherwise
+        # return None (without waiting)
+        with self.lock:
+            if not self.ready:
+                self.misses = self.misses + 1
+                self.refill()
+                return None
+            return self.take()
+
+    def take(self):
+        # Hand out the oldest ready keypair; the caller must hold the lock
+        keypair = self.ready.popleft()
+        self.served = self.served + 1
+        self.refill()
+        return keypair
+
+    def stats(self):
+        # Return a snapshot of how the pool is doing:
+        #  - depth, the number of keypairs ready right now
+        #  - pending, the number being generated
+        #  - generated, served, misses and errors, counted since we started
+        #  - failing, whether we've given up after max_failures errors in a
+        #    row
+        #  - refill_rate, keypairs per second over the most recent refills
+        #    (and average_rate, over the whole lifetime of the pool)
+        with self.lock:
+            now = time.monotonic()
+            refill_rate = 0.0
+            if len(self.recent) > 1 and self.recent[-1] > self.recent[0]:
+                refill_rate = ((len(self.recent) - 1) /
+                               (self.recent[-1] - self.recent[0]))
+            return {
+                'depth': len(self.ready),
+                'pending': self.pending,
+                'low_water': self.low_water,
+                'high_water': self.high_water,
+                'generated': self.generated,
+                'served': self.served,
+                'misses': self.misses,
+                'errors': self.errors,
+                'failing': self.failing(),
+                'refill_rate': refill_rate,
+                'average_rate': self.generated / (now - self.started),
+            }
+
+    def close(self):
+        # Stop the workers (any keys still being generated are discarded)
+        with self.lock:
+            self.closed = True
+            self.lock.notify_all()
+        self.workers.terminate()
+        self.workers.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
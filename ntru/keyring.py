@@ -0,0 +1,178 @@
+#
+# Several live private keys, and a way to tell which one a ciphertext is for
+import time       # To record when each key was added, and last used
+import hashlib    # To get SHA-3
+import threading  # So that keys can be added and retired by any thread
+
+#
+# A server that rotates its keys has more than one live at a time (the new
+# one, and the old ones that clients may still be using).  kem_decapsulate
+# can't tell which key a ciphertext was made for (and, as a wrong key just
+# gives a random looking shared secret, trying each one in turn doesn't
+# tell us either, short of finishing the key exchange)
+#
+# So each key is known by its id: the SHA3-256 hash of its packed public
+# key, which anyone with the public key can work out.  The client sends the
+# first tag_bytes bytes of the id in front of the ciphertext (a 'tagged'
+# ciphertext), and NTRU_keyring looks the key up by that
+#
+# Adding and retiring keys never holds up an operation that is running:
+# the keys are in a dict that we never change; to add or retire a key, we
+# build a new dict and replace the old one (under a lock, which only other
+# adds and retires wait for).  An operation looks its key up in whichever
+# dict is there when it starts, and finishes with that key even if it is
+# retired in the meantime
+#
+# For each key, we count the encapsulations and decapsulations done with
+# it, and when it was added and last used (see stats)
+
+def key_id(public_key):
+    # The id of the key with the (packed) public key public_key
+    return hashlib.sha3_256(public_key).digest()
+
+class NTRU_keyring_entry:
+    #
+    # One key in a key ring, and its counters
+    __slots__ = ('private_key', 'public_key', 'id', 'added', 'last_used',
+                 'encapsulations', 'decapsulations')
+
+    def __init__(self, private_key, public_key):
+        self.private_key = private_key
+        self.public_key = public_key
+        self.id = key_id(public_key)
+        self.added = time.time()
+        self.last_used = None
+        self.encapsulations = 0
+        self.decapsulations = 0
+
+class NTRU_keyring:
+    #
+    # tag_bytes is how much of the key id tagged ciphertexts carry (32, all
+    # of it, by default).  The ids only need to tell our own keys apart, so
+    # as few as 8 bytes is plenty
+    def __init__(self, tag_bytes=32):
+        if not 1 <= tag_bytes <= 32:
+            raise ValueError    # The tag is part of a SHA3-256 hash
+        self.tag_bytes = tag_bytes
+        self.keys = {}          # The NTRU_keyring_entry for each tag; we
+                                # replace this dict, rather than change it
+        self.lock = threading.Lock()        # For adding and retiring
+        self.count_lock = threading.Lock()  # For the counters
+
+    def add(self, private_key, public_key=None):
+        # Add the NTRU_privatekey private_key (whose packed public key is
+        # public_key; by default, we pack its H), and return its id
+        if public_key is None:
+            if getattr(private_key, 'H', None) is None:
+                raise ValueError    # We need the public key for the id
+            public_key = private_key.pack_Rq0(private_key.H)
+        entry = NTRU_keyring_entry(private_key, bytes(public_key))
+        tag = entry.id[:self.tag_bytes]
+        with self.lock:
+            existing = self.keys.get(tag)
+            if existing is not None and existing.id != entry.id:
+                raise ValueError    # Two keys with the same tag; use a
+                                    # larger tag_bytes
+            keys = dict(self.keys)
+            keys[tag] = entry
+            self.keys = keys
+        return entry.id
+
+    def add_many(self, keypairs):
+        # Add each of keypairs, a list of (NTRU_privatekey, packed public
+        # key) pairs (as NTRU_keypool and key_gen_many give them), and
+        # return the list of their ids
+        return [self.add(private_key, public_key)
+                for private_key, public_key in keypairs]
+
+    def retire(self, id):
+        # Stop using the key with the id (or tag) id.  Operations already
+        # running with it finish normally
+        with self.lock:
+            keys = dict(self.keys)
+            if keys.pop(bytes(id[:self.tag_bytes]), None) is None:
+                raise KeyError('no key with that id in the key ring')
+            self.keys = keys
+
+    def entry(self, id):
+        # The NTRU_keyring_entry for the id (or tag) id
+        entry = self.keys.get(bytes(id[:self.tag_bytes]))
+        if entry is None:
+            raise KeyError('no key with that id in the key ring')
+        return entry
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, id):
+        return bytes(id[:self.tag_bytes]) in self.keys
+
+    def ids(self):
+        # The ids of the keys we hold, oldest first
+        return [entry.id for entry in sorted(self.keys.values(),
+                                             key=lambda entry: entry.added)]
+
+    def public_key(self, id):
+        return self.entry(id).public_key
+
+    def private_key(self, id):
+        return self.entry(id).private_key
+
+    def used(self, entry, encapsulations=0, decapsulations=0):
+        with self.count_lock:
+            entry.encapsulations = entry.encapsulations + encapsulations
+            entry.decapsulations = entry.decapsulations + decapsulations
+            entry.last_used = time.time()
+
+    #
+    # The KEM operations
+    def kem_encapsulate(self, id):
+        # Encapsulate to our key with the id id; this returns the tagged
+        # ciphertext (which kem_decapsulate accepts), and the shared secret
+        entry = self.entry(id)
+        C, K = entry.private_key.kem_encapsulate(entry.public_key)
+        self.used(entry, encapsulations=1)
+        return entry.id[:self.tag_bytes] + bytes(C), K
+
+    def split(self, tagged):
+        # Split a tagged ciphertext into our key for it, and the ciphertext
+        tagged = memoryview(tagged)
+        return self.entry(tagged[:self.tag_bytes]), tagged[self.tag_bytes:]
+
+    def kem_decapsulate(self, tagged):
+        # Decapsulate the tagged ciphertext tagged (the key's tag, followed
+        # by the ciphertext), with the key it is tagged with
+        entry, C = self.split(tagged)
+        K = entry.private_key.kem_decapsulate(C)
+        self.used(entry, decapsulations=1)
+        return K
+
+    def kem_decapsulate_many(self, tagged):
+        # The same, for each of the list of tagged ciphertexts tagged; the
+        # ones for each key are decapsulated together (see
+        # kem_decapsulate_many), and the shared secrets returned in the same
+        # order as the ciphertexts
+        batches = {}        # The (position, ciphertext) for each key
+        for position, ciphertext in enumerate(tagged):
+            entry, C = self.split(ciphertext)
+            batches.setdefault(entry.id, (entry, []))[1].append((position,
+                                                                 C))
+        results = [None] * len(tagged)
+        for entry, batch in batches.values():
+            secrets = entry.private_key.kem_decapsulate_many(
+                                         [bytes(C) for _, C in batch])
+            for (position, _), K in zip(batch, secrets):
+                results[position] = K
+            self.used(entry, decapsulations=len(batch))
+        return results
+
+    def stats(self):
+        # Return the counters for each key, as a dict from the key id (in
+        # hex) to a dict of them
+        with self.count_lock:
+            return {entry.id.hex(): {
+                        'added': entry.added,
+                        'last_used': entry.last_used,
+                        'encapsulations': entry.encapsulations,
+                        'decapsulations': entry.decapsulations,
+                    } for entry in self.keys.values()}
@@ -0,0 +1,144 @@
+#
+# A file holding many NTRU keypairs, that can be shared between processes
+import os         # To replace a key store file in one step
+import mmap       # To map the key store into memory
+import struct     # For the key store header
+import threading  # To decode each key only once, whichever thread asks
+from .core import NTRU_privatekey
+
+#
+# A server with many worker processes that all use the same (long term)
+# keys shouldn't have each one generate them, or be sent them as pickled
+# lists.  Instead, the keys can be written once to a key store; each worker
+# maps the file into memory (which the operating system shares between all
+# the processes that map it), and only decodes a key into an
+# NTRU_privatekey the first time it actually uses it
+#
+# The file is a header followed by 'count' records, one per keypair, all
+# the same size; each record is the packed public key followed by the
+# private key (as pack_private_key encodes it).  The header is
+#   magic         8 bytes, 'NTRUKEYS'
+#   version       2 bytes (1)
+#   (reserved)    2 bytes
+#   count         4 bytes
+#   record size   4 bytes
+#   public key    4 bytes (its size)
+#   private key   4 bytes (its size)
+#   parameter set 32 bytes (its name, padded with zero bytes)
+#   (padding)     4 bytes
+# with all the numbers little endian.  Every key in one store is for the
+# same parameter set
+keystore_header = struct.Struct('<8sHHIIII32s4x')
+keystore_magic = b'NTRUKEYS'
+keystore_version = 1
+
+def write_keystore(path, parameter_set, keypairs):
+    # Write a key store holding keypairs, a list of (NTRU_privatekey, packed
+    # public key) pairs (as NTRU_keypool and generate_keypair give them),
+    # all for parameter_set
+    # We write a new file and then rename it over path, rather than write
+    # path in place; that way, processes that still have the old file mapped
+    # keep seeing the old keys, rather than a mixture
+    ntru = NTRU_privatekey(parameter_set)
+    public_bytes = ntru.packed_Rq0_bytes
+    private_bytes = ntru.packed_private_key_bytes
+    name = parameter_set.encode('ascii')
+    if len(name) > 32:
+        raise ValueError    # Parameter set name too long
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as file:
+        file.write(keystore_header.pack(keystore_magic, keystore_version, 0,
+                                        len(keypairs),
+                                        public_bytes + private_bytes,
+                                        public_bytes, private_bytes, name))
+        for private_key, public_key in keypairs:
+            packed = private_key.pack_private_key()
+            if len(public_key) != public_bytes or \
+                    len(packed) != private_bytes:
+                raise ValueError    # Key for a different parameter set
+            file.write(public_key)
+            file.write(packed)
+    os.replace(temporary, path)
+
+class NTRU_keystore:
+    #
+    # A key store, opened (and mapped into memory) for reading.  Any extra
+    # keyword arguments are passed to NTRU_privatekey when we decode a key
+    # (for example, multiply_backend or arithmetic)
+    #
+    # This can be pickled (say, to send it to a worker process); the copy
+    # opens the same file again, rather than carrying the keys along
+    def __init__(self, path, **options):
+        self.path = path
+        self.options = options
+        with open(path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < keystore_header.size:
+            raise ValueError    # Too short to be a key store
+        (magic, version, _, count, record_bytes, public_bytes,
+            private_bytes, name) = keystore_header.unpack_from(self.map)
+        if magic != keystore_magic or version != keystore_version:
+            raise ValueError    # Not a key store (or not one we understand)
+        self.parameter_set = name.rstrip(b'\0').decode('ascii')
+        ntru = NTRU_privatekey(self.parameter_set, **options)
+        if public_bytes != ntru.packed_Rq0_bytes or \
+                private_bytes != ntru.packed_private_key_bytes or \
+                record_bytes != public_bytes + private_bytes:
+            raise ValueError    # The sizes don't match the parameter set
+        if len(self.map) < keystore_header.size + count * record_bytes:
+            raise ValueError    # The file has been cut short
+        self.count = count
+        self.record_bytes = record_bytes
+        self.public_bytes = public_bytes
+        self.keys = [None] * count      # The keys we've decoded so far
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def record(self, index):
+        # Where the record for keypair index starts
+        if not 0 <= index < self.count:
+            raise IndexError('key store index out of range')
+        return keystore_header.size + index * self.record_bytes
+
+    def public_key(self, index):
+        # The packed public key of keypair index
+        offset = self.record(index)
+        return self.map[offset:offset+self.public_bytes]
+
+    def private_key(self, index):
+        # The NTRU_privatekey for keypair index, which we decode (straight
+        # out of the mapped file) the first time it is asked for
+        offset = self.record(index)
+        key = self.keys[index]
+        if key is None:
+            with self.lock:
+                key = self.keys[index]
+                if key is None:
+                    key = NTRU_privatekey(self.parameter_set, **self.options)
+                    key.unpack_private_key(self.map,
+                                           offset + self.public_bytes,
+                                           self.public_key(index))
+                    self.keys[index] = key
+        return key
+
+    def decoded(self):
+        # How many of the keys we've decoded
+        return sum(key is not None for key in self.keys)
+
+    def close(self):
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def __reduce__(self):
+        return (open_keystore, (self.path, self.options))
+
+def open_keystore(path, options):
+    # (what a pickled NTRU_keystore is rebuilt with)
+    return NTRU_keystore(path, **options)
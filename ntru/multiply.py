@@ -0,0 +1,419 @@
+#
+# The polynomial multiplication backends used by NTRU_base (see core.py).
+# These work on plain lists of coefficients, and need nothing beyond the
+# standard library
+import sys        # To find out the byte order of this machine
+import operator   # To add and subtract whole lists with map
+from array import array  # To convert between lists and big integers quickly
+
+#
+# Polynomial multiplication backends
+#
+# Multiplying two polynomials modulo x^n-1 (that is, computing their 'cyclic
+# convolution') is where NTRU spends most of its time.  The obvious way of
+# doing it (multiply every coefficient of A by every coefficient of B) takes
+# n^2 steps; for n=677, that's about 458,000 multiply-adds per multiply, and
+# key generation does more than ten of them.
+#
+# Below are several ways of computing the same thing.  Each one takes two
+# polynomials A and B (lists of n integers) and returns the list of n
+# integers Product, where Product[z] is the sum of A[x]*B[y] over all x, y
+# with x+y = z mod n.  The faster methods are allowed to return values that
+# are only correct modulo 'modulus' (which will be either q or 3); the
+# caller always reduces the result modulo that anyway.
+#
+
+def convolve_schoolbook(A, B, n, modulus):
+    # This is the obvious method; it is the reference that the other
+    # methods are checked against
+    Product = []
+    for _ in range(n):
+        Product.append(0)
+    for x in range(n):
+        for y in range(n):
+            z = (x + y) % n
+            Product[z] = Product[z] + A[x]*B[y]
+    return Product
+
+def karatsuba(A, B):
+    # Multiply two polynomials of the same length (without any reduction
+    # modulo x^n-1); this returns a list of 2*len(A)-1 coefficients
+    # Karatsuba's trick is to split each polynomial into a low and a high
+    # half, A = A0 + A1*x^k, B = B0 + B1*x^k, and then notice that
+    #   A*B = A0*B0 + ((A0+A1)*(B0+B1) - A0*B0 - A1*B1)*x^k + A1*B1*x^2k
+    # which needs only three half-sized multiplies rather than four
+    return karatsuba_split(A, karatsuba_tree(B))
+
+def karatsuba_tree(B):
+    # The pieces of B that karatsuba multiplies by: B itself, if it is small
+    # enough to multiply the obvious way, and otherwise (as a tuple) the
+    # pieces of B0, B1 and B0+B1.  These depend only on B, and so, for a B
+    # we multiply by many times, we can work them out once (see
+    # prepare_karatsuba)
+    length = len(B)
+    if length <= 32:
+        return B
+    k = length // 2
+    B0, B1 = B[:k], B[k:]
+    # Pad the low half so that all the pieces are the same length
+    B0 = B0 + [0] * (len(B1) - k)
+    return (karatsuba_tree(B0), karatsuba_tree(B1),
+            karatsuba_tree([b0 + b1 for b0, b1 in zip(B0, B1)]))
+
+def karatsuba_split(A, B):
+    # karatsuba, given the pieces of B (as karatsuba_tree gives them)
+    length = len(A)
+    if length <= 32:
+        # Small enough that the obvious method is faster than recursing
+        Product = [0] * (2*length - 1)
+        for x in range(length):
+            a = A[x]
+            if a != 0:
+                for y in range(length):
+                    Product[x+y] += a * B[y]
+        return Product
+    k = length // 2
+    A0, A1 = A[:k], A[k:]
+    A0 = A0 + [0] * (len(A1) - k)
+    B0, B1, B01 = B
+    Low = karatsuba_split(A0, B0)
+    High = karatsuba_split(A1, B1)
+    Mid = karatsuba_split([a0 + a1 for a0, a1 in zip(A0, A1)], B01)
+    Product = [0] * (2*length - 1)
+    for x in range(len(Low)):
+        Mid[x] -= Low[x] + High[x]
+    for x in range(2*k - 1):
+        Product[x] += Low[x]
+    for x in range(len(Mid)):
+        Product[x+k] += Mid[x]
+    for x in range(2*length - 2*k - 1):
+        Product[x+2*k] += High[x]
+    return Product
+
+def prepare_karatsuba(B, n, modulus):
+    # Split B up once, so that convolve_karatsuba can skip that
+    return karatsuba_tree(list(B))
+
+def convolve_karatsuba(A, B, n, modulus):
+    # Compute the full product with Karatsuba, and then reduce it modulo
+    # x^n-1 by adding the coefficient of x^(i+n) to the coefficient of x^i
+    # (B may be the pieces prepare_karatsuba gives)
+    if isinstance(B, tuple):
+        Full = karatsuba_split(list(A), B)
+    else:
+        Full = karatsuba(list(A), list(B))
+    Product = Full[:n]
+    for x in range(n, 2*n - 1):
+        Product[x-n] += Full[x]
+    return Product
+
+def kronecker_typecode(n, modulus):
+    # Pick the array typecode (and hence the width w of each field) for
+    # convolve_kronecker
+    bound = n * (modulus-1) * (modulus-1)
+    for typecode in ('H', 'I', 'Q'):
+        if bound < 2**(8 * array(typecode).itemsize):
+            return typecode
+    raise ValueError    # Coefficients too large for this method
+
+def kronecker_evaluate(A, modulus, typecode):
+    # Evaluate the polynomial A at 2^w; we let array lay out the w-bit fields
+    # for us, and then read the resulting string as one big integer
+    a = array(typecode, [x % modulus for x in A])
+    if sys.byteorder == 'big':
+        a.byteswap()
+    return int.from_bytes(a.tobytes(), 'little')
+
+def prepare_kronecker(B, n, modulus):
+    # Evaluate B once, so that convolve_kronecker can skip it
+    return kronecker_evaluate(B, modulus, kronecker_typecode(n, modulus))
+
+def convolve_kronecker(A, B, n, modulus):
+    # Python has fast (subquadratic) multiplication of big integers built in;
+    # this uses it to multiply polynomials.  This is known as 'Kronecker
+    # substitution'; we evaluate both polynomials at x = 2^w (for w large
+    # enough that no product coefficient will overflow w bits), multiply the
+    # two resulting integers, and read the product coefficients back out of
+    # the w-bit fields of the result
+    #
+    # This works only for nonnegative coefficients, so we first reduce the
+    # coefficients into the range [0, modulus).  Each coefficient of the
+    # product is then a sum of n products of such values; we pick w so that
+    # this sum always fits
+    #
+    # B may also be the integer that prepare_kronecker returned for it (if
+    # we multiply by the same B many times, that saves evaluating it again)
+    typecode = kronecker_typecode(n, modulus)
+    width = 8 * array(typecode).itemsize
+    a = kronecker_evaluate(A, modulus, typecode)
+    if isinstance(B, int):
+        b = B
+    else:
+        b = kronecker_evaluate(B, modulus, typecode)
+
+    # Multiply; this gives the (2n-1)-coefficient product
+    p = a * b
+
+    # Reduce modulo x^n-1; this moves the coefficients of x^n and above
+    # (the upper n*w bits) down onto the coefficients of x^0 and above.
+    # Because no coefficient of the reduced product can overflow, this is a
+    # single addition
+    p = (p & ((1 << (n*width)) - 1)) + (p >> (n*width))
+
+    # And read back the coefficients
+    Product = array(typecode)
+    Product.frombytes(p.to_bytes(n * width // 8, 'little'))
+    if sys.byteorder == 'big':
+        Product.byteswap()
+    return Product.tolist()
+
+#
+# convolve_kronecker uses fields that are exactly the size of one of the
+# array typecodes (2, 4 or 8 bytes).  Code that keeps polynomials in
+# Kronecker form for a while (NTRU_privatekey.decrypt_fused) can save time
+# by using fields of just as many bytes as it needs (say, 3 or 5), as the
+# smaller the integers, the faster we can multiply them.  These convert
+# between lists and such integers; we still let array lay out the fields,
+# and then add or remove the extra bytes of each field
+
+def field_typecode(size):
+    # The smallest array typecode whose items are at least size bytes
+    for typecode in ('B', 'H', 'I', 'Q'):
+        if array(typecode).itemsize >= size:
+            return typecode
+    raise ValueError    # Fields too large
+
+def kronecker_pack(A, size):
+    # Evaluate the polynomial A (whose coefficients must be nonnegative, and
+    # fit in size bytes) at 2^(8*size)
+    a = array(field_typecode(size), A)
+    if sys.byteorder == 'big':
+        a.byteswap()
+    data = bytearray(a.tobytes())
+    narrow_fields(data, a.itemsize, size)
+    return int.from_bytes(data, 'little')
+
+def kronecker_resize(p, n, size, new_size):
+    # Move the n coefficients of p from fields of size bytes to (narrower)
+    # fields of new_size bytes; the coefficients must fit the new fields
+    data = bytearray(p.to_bytes(n * size, 'little'))
+    narrow_fields(data, size, new_size)
+    return int.from_bytes(data, 'little')
+
+def narrow_fields(data, size, new_size):
+    # Remove the top bytes of each size-byte field of the bytearray data,
+    # leaving new_size bytes of each
+    for extra in range(size - 1, new_size - 1, -1):
+        del data[extra::extra+1]    # Remove the top byte of each field
+
+def kronecker_unpack(p, n, size):
+    # Read n coefficients back out of the size-byte fields of the integer p
+    A = array(field_typecode(size))
+    data = p.to_bytes(n * size, 'little')
+    if A.itemsize > size:
+        # Spread the fields out to the size of an array item
+        wide = bytearray(n * A.itemsize)
+        for x in range(size):
+            wide[x::A.itemsize] = data[x::size]
+        data = wide
+    A.frombytes(data)
+    if sys.byteorder == 'big':
+        A.byteswap()
+    return A.tolist()
+
+#
+# Ternary multiplication kernels
+#
+# Most of the polynomials NTRU multiplies have every coefficient -1, 0 or 1
+# ('ternary'): R in encrypt, F in decrypt, F and G in key_gen, and so on.
+# When one operand is ternary, every coefficient of the product is a sum of
+# (plus or minus) coefficients of the other one, rather than a sum of
+# products; the kernels below take advantage of that.  Each takes the dense
+# polynomial D and the ternary polynomial T, and returns the same thing as
+# convolve(D, T) would (again, correct modulo modulus).  NTRU_base.multiply
+# and multiply_3 use the kernel for their backend whenever either operand is
+# ternary (see is_ternary)
+#
+# Note that these take time that depends on the weight of T (and, for
+# convolve_sparse, touch memory depending on where its nonzero coefficients
+# are); as with the rest of this code, no attempt at constant time
+
+def is_ternary(A):
+    # Whether A is a list whose coefficients are all -1, 0 or 1 (or a
+    # prepared polynomial that was prepared from one)
+    if isinstance(A, NTRU_prepared_polynomial):
+        return A.ternary
+    # (this stops at the first coefficient that isn't, which for a dense
+    # polynomial is almost always the first or second).  An array (such as
+    # an NTRU_polynomial) counts as a list here
+    return isinstance(A, (list, array)) and \
+           all(map((0, 1, -1).__contains__, A))
+
+def ternary_indices(T):
+    # The positions of the 1 coefficients of T, and of the -1 coefficients
+    plus = [x for x, t in enumerate(T) if t == 1]
+    minus = [x for x, t in enumerate(T) if t == -1]
+    return (plus, minus)
+
+def prepare_sparse(B, n, modulus, ternary):
+    # Prepare B for convolve_sparse; if it is the ternary operand, that's
+    # its index lists, otherwise there's nothing to do
+    if ternary:
+        return ternary_indices(B)
+    return B
+
+def add_rotations(DD, n, positions):
+    # The sum of D*x^i over the i in positions, where DD is D written out
+    # twice (the coefficients of D*x^i are the slice DD[n-i:2n-i])
+    if not positions:
+        return [0] * n
+    return list(map(sum, zip(*[DD[n-x:2*n-x] for x in positions])))
+
+def convolve_sparse(D, T, n, modulus):
+    # The kernel for the schoolbook backend.  D*T is the sum of D*x^i over
+    # the i where T[i] is 1, less the sum over those where T[i] is -1; and
+    # D*x^i is just D rotated i places.  So we line up those rotated copies,
+    # and add them up a position at a time (about n*w additions for T of
+    # weight w, rather than the n^2 multiply-adds convolve_schoolbook does)
+    # T may also be the index lists prepare_sparse returned for it
+    if isinstance(T, tuple):
+        plus, minus = T
+    else:
+        plus, minus = ternary_indices(T)
+    DD = list(D) * 2
+    return list(map(operator.sub, add_rotations(DD, n, plus),
+                                  add_rotations(DD, n, minus)))
+
+def ternary_field_size(n, modulus):
+    # The field size (in bytes) convolve_kronecker_ternary uses; the
+    # coefficients of D are less than modulus, and of T+1 at most 2, and we
+    # need room to add modulus to each coefficient of the product
+    return ((n * (modulus-1) * 2 + modulus).bit_length() + 7) // 8
+
+def prepare_kronecker_ternary(B, n, modulus, ternary):
+    # Prepare B for convolve_kronecker_ternary: if it is the ternary operand,
+    # that is T+1 evaluated; otherwise, it is D evaluated (with its
+    # coefficients reduced mod modulus), along with the sum of those
+    # coefficients
+    size = ternary_field_size(n, modulus)
+    if ternary:
+        return kronecker_pack([x + 1 for x in B], size)
+    B = [x % modulus for x in B]
+    return (kronecker_pack(B, size), sum(B))
+
+def convolve_kronecker_ternary(D, T, n, modulus):
+    # The kernel for the kronecker backend.  This is convolve_kronecker with
+    # narrower fields: a coefficient of D*T is a sum of at most n values
+    # less than modulus, rather than of n products of them, and so needs
+    # about half the bits (and the smaller the integers, the faster Python
+    # multiplies them; at q = 4096 this takes 3 byte fields rather than 8)
+    # To keep everything nonnegative, we multiply by T+1 (whose coefficients
+    # are 0, 1 or 2) instead of T.  That adds D*(1 + x + ... + x^(n-1)) to
+    # the product, every coefficient of which is the sum of the coefficients
+    # of D; so we then subtract that sum (mod modulus) from every field
+    # D and T may also be what prepare_kronecker_ternary returned for them
+    size = ternary_field_size(n, modulus)
+    if isinstance(D, tuple):
+        d, total = D
+    else:
+        d, total = prepare_kronecker_ternary(D, n, modulus, False)
+    if isinstance(T, int):
+        t = T
+    else:
+        t = prepare_kronecker_ternary(T, n, modulus, True)
+
+    shift = n * 8 * size
+    p = d * t
+    p = (p & ((1 << shift) - 1)) + (p >> shift)    # Reduce mod x^n-1
+    ones = int.from_bytes((b'\x01' + bytes(size-1)) * n, 'little')
+    p = p + (-total % modulus) * ones
+    return kronecker_unpack(p, n, size)
+
+multiply_backends = {
+    'schoolbook': convolve_schoolbook,
+    'karatsuba': convolve_karatsuba,
+    'kronecker': convolve_kronecker,
+}
+
+# Backends that can do some of their work ahead of time on a polynomial that
+# will be multiplied many times.  Each takes the polynomial B (along with n
+# and modulus), and returns something that the backend's convolve routine
+# accepts in place of B.  Backends not listed here just use B as is
+prepare_backends = {
+    'karatsuba': prepare_karatsuba,
+    'kronecker': prepare_kronecker,
+}
+
+# The ternary kernel for each backend, and the routine that prepares an
+# operand for it (as prepare_backends does; this takes a flag saying whether
+# the operand is the ternary one)
+# (karatsuba doesn't have one: its base case already skips the zero
+# coefficients of A, and convolve_sparse is only faster than it when T is
+# mostly zeros)
+ternary_backends = {
+    'schoolbook': convolve_sparse,
+    'kronecker': convolve_kronecker_ternary,
+}
+prepare_ternary_backends = {
+    'schoolbook': prepare_sparse,
+    'kronecker': prepare_kronecker_ternary,
+}
+
+def ternary_kernel(backend, n, modulus):
+    # The ternary kernel to use with backend (or None, if it should do
+    # ternary products itself).  convolve_kronecker_ternary is only worth it
+    # if its fields are narrower than convolve_kronecker's; mod 3 they
+    # aren't
+    if backend == 'kronecker' and ternary_field_size(n, modulus) >= \
+            array(kronecker_typecode(n, modulus)).itemsize:
+        return None
+    return ternary_backends.get(backend)
+
+class NTRU_prepared_polynomial:
+    #
+    # A polynomial that we're going to multiply by many times (such as a
+    # public key), along with the form the multiplication backend would
+    # otherwise have to recompute on every multiply.  NTRU_base.multiply
+    # (or multiply_3, if it was prepared mod 3) accepts this in place of
+    # the polynomial itself
+    # We also prepare it for the backend's ternary kernel: as T, if it is
+    # ternary itself, and otherwise as D
+    def __init__(self, ntru, B, modulus):
+        self.polynomial = B
+        self.modulus = modulus
+        self.backend = ntru.multiply_backend
+        self.ternary = False
+        if ntru.use_numpy:
+            self.form = ntru.wide(B)
+        elif self.backend in prepare_backends:
+            self.form = prepare_backends[self.backend](B, ntru.n, modulus)
+        else:
+            self.form = list(B)     # (indexing a list is the cheapest; see
+                                    # poly.py)
+        if not ntru.use_numpy and ternary_kernel(self.backend, ntru.n,
+                                                 modulus) is not None:
+            self.ternary = is_ternary(B)
+            prepare = prepare_ternary_backends[self.backend]
+            self.ternary_form = prepare(B, ntru.n, modulus, self.ternary)
+
+    def operand(self, ntru, modulus):
+        # Return what ntru should use for this polynomial when multiplying
+        # mod modulus
+        if modulus == self.modulus and ntru.multiply_backend == self.backend:
+            return self.form
+        return self.polynomial
+
+    def ternary_operand(self, ntru, modulus):
+        # The same, for the ternary kernel
+        if modulus == self.modulus and ntru.multiply_backend == self.backend:
+            return self.ternary_form
+        return self.polynomial
+
+def default_multiply_backend(n):
+    # Select which multiplication backend to use, based on the size of the
+    # polynomials.  For tiny polynomials, the obvious method is as fast as
+    # anything, and easier to follow in a debugger; otherwise, we use
+    # Kronecker substitution, which is by far the fastest in Python
+    if n < 64:
+        return 'schoolbook'
+    return 'kronecker'
@@ -0,0 +1,124 @@
+#
+# A compact polynomial type
+from array import array  # For the storage
+from .multiply import multiply_backends, default_multiply_backend
+
+#
+# The list arithmetic keeps polynomials as Python lists, which is the
+# easiest to follow, but not small: each coefficient is an 8 byte pointer to
+# an int object (of 28 bytes, unless it is one of the small values Python
+# keeps around), so a polynomial of 677 coefficients mod q takes about 24k.
+# That's fine for the ones we compute and throw away; less so for the ones
+# we keep (a private key holds four, and a public key cache one for every
+# key in it)
+#
+# NTRU_polynomial holds its coefficients (in the balanced representation)
+# as 16 bit integers in an array('h'), which takes 2 bytes a coefficient,
+# and remembers its modulus (q, or 3); the number of coefficients is n.
+# Because it is an array, it can be indexed, sliced and iterated over like
+# a list (so all the NTRU_base methods that accept a list accept one of
+# these), and it exports its storage through the buffer protocol (so
+# memoryview, NumPy, and bytes-like consumers can read it without copying)
+# A slice is an NTRU_polynomial too (with the same modulus), and a
+# polynomial compares equal to a list (or tuple) of the same coefficients,
+# as the lists the list arithmetic used to keep did
+# The arithmetic operators work in the polynomial's ring (mod modulus, and
+# mod x^n-1), rather than being array's concatenation and repetition:
+#   A + B, A - B, -A (and +=, -=), and A * B (and *=), where B is another
+#   polynomial, or (for *) an integer
+
+class NTRU_polynomial(array):
+    __slots__ = ('modulus',)
+
+    def __new__(cls, coefficients, modulus):
+        self = array.__new__(cls, 'h', [balanced(x, modulus)
+                                        for x in coefficients])
+        self.modulus = modulus
+        return self
+
+    def __repr__(self):
+        return 'NTRU_polynomial(%r, %d)' % (self.tolist(), self.modulus)
+
+    def __reduce_ex__(self, protocol):
+        # (array's own version would lose the modulus)
+        return (type(self), (self.tolist(), self.modulus))
+
+    def __copy__(self):
+        return type(self)(self, self.modulus)
+
+    def __deepcopy__(self, memo):
+        return self.__copy__()
+
+    def __getitem__(self, index):
+        # (array's own slices would be plain arrays, without the modulus)
+        if isinstance(index, slice):
+            part = array.__new__(type(self), 'h',
+                                 array.__getitem__(self, index))
+            part.modulus = self.modulus
+            return part
+        return array.__getitem__(self, index)
+
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple)):
+            return self.tolist() == list(other)
+        if getattr(other, 'modulus', self.modulus) != self.modulus:
+            return False    # Different rings
+        return array.__eq__(self, other)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    __hash__ = None     # (as for a list)
+
+    def ring(self, other):
+        # Check that other is a polynomial we can combine with this one
+        if len(other) != len(self) or \
+                getattr(other, 'modulus', self.modulus) != self.modulus:
+            raise ValueError    # Different rings
+        return other
+
+    def __add__(self, other):
+        return type(self)(map(int.__add__, self, self.ring(other)),
+                          self.modulus)
+
+    def __sub__(self, other):
+        return type(self)(map(int.__sub__, self, self.ring(other)),
+                          self.modulus)
+
+    def __neg__(self):
+        return type(self)([-x for x in self], self.modulus)
+
+    def __mul__(self, other):
+        if isinstance(other, int):
+            return type(self)([x * other for x in self], self.modulus)
+        # Multiply (mod x^n-1) with the multiplication backend NTRU_base
+        # would pick by default
+        n = len(self)
+        convolve = multiply_backends[default_multiply_backend(n)]
+        return type(self)(convolve(list(self), list(self.ring(other)), n,
+                                   self.modulus), self.modulus)
+
+    def __rmul__(self, other):
+        return self.__mul__(other)
+
+    # The in-place versions replace the coefficients, rather than the
+    # polynomial
+    def __iadd__(self, other):
+        self[:] = self + other
+        return self
+
+    def __isub__(self, other):
+        self[:] = self - other
+        return self
+
+    def __imul__(self, other):
+        self[:] = self * other
+        return self
+
+def balanced(x, modulus):
+    # x mod modulus, between -modulus/2 and modulus/2 (for modulus 3, -1 to
+    # 1); the same as NTRU_base.modq and mod3
+    return ((x + modulus//2) % modulus) - modulus//2
@@ -0,0 +1,102 @@
+#
+# The sources of random bytes NTRU_base can use (see its rng option)
+# Each has a single method, random_bytes(count), which returns count random
+# bytes; the sampling routines ask for all the bytes a polynomial needs in
+# one call.  Anything else with that method can be used as well
+import os         # For the operating system's CSPRNG
+import hashlib    # For SHAKE
+import threading  # So that one DRBG can be shared between threads
+
+class NTRU_system_random:
+    #
+    # The default: the operating system's cryptographically secure random
+    # number generator.  This has no state of its own (so it can be shared
+    # freely, including with other processes)
+    def random_bytes(self, count):
+        return os.urandom(count)
+
+class NTRU_drbg:
+    #
+    # What the seedable generators have in common.  Given the same seed,
+    # they produce the same bytes, which makes everything that uses them
+    # (key generation, encapsulation, ...) repeatable; that's useful for
+    # testing and benchmarking, and a disaster anywhere else, unless the seed
+    # is itself secret and random
+    # Copying one (which includes pickling it, say to send it to a key pool
+    # worker) would give two generators producing the same bytes; so we
+    # don't allow that
+    def __init__(self):
+        self.lock = threading.Lock()
+
+    def __reduce__(self):
+        raise TypeError('%s cannot be copied, as the copy would repeat its '
+                        'output' % type(self).__name__)
+
+class NTRU_shake_drbg(NTRU_drbg):
+    #
+    # A DRBG based on SHAKE-256.  The state is a 32 byte key K; to produce
+    # count bytes, we compute SHAKE-256(K) to 32+count bytes, and use the
+    # first 32 as the next K, and return the rest (so working out earlier
+    # output from the current state means inverting SHAKE)
+    def __init__(self, seed):
+        super().__init__()
+        self.key = hashlib.sha3_256(bytes(seed)).digest()
+
+    def random_bytes(self, count):
+        with self.lock:
+            output = hashlib.shake_256(self.key).digest(32 + count)
+            self.key = output[:32]
+        return output[32:]
+
+class NTRU_aes_ctr_drbg(NTRU_drbg):
+    #
+    # The AES-256 CTR_DRBG (without a derivation function) from NIST SP
+    # 800-90A; this is the generator the NIST PQC reference code uses
+    # (randombytes_init, randombytes) to produce its known answer tests.  The
+    # seed (the entropy input) is 48 bytes, as is the optional
+    # personalization string
+    # We take AES from the 'cryptography' package, which (like NumPy) is
+    # optional; it's only imported when one of these is created
+    def __init__(self, seed, personalization=None):
+        super().__init__()
+        try:
+            from cryptography.hazmat.primitives.ciphers import (
+                Cipher, algorithms, modes)
+        except ImportError:
+            raise ImportError('the AES CTR_DRBG requires cryptography')
+        self.Cipher, self.AES, self.CTR = Cipher, algorithms.AES, modes.CTR
+        if len(seed) != 48:
+            raise ValueError    # The seed must be 48 bytes
+        material = bytes(seed)
+        if personalization is not None:
+            if len(personalization) != 48:
+                raise ValueError    # So must the personalization string
+            material = bytes(a ^ b for a, b in zip(material, personalization))
+        self.key = bytes(32)
+        self.V = 0
+        self.update(material)
+
+    def blocks(self, count):
+        # Return the AES encryptions (under the current key) of V+1, V+2,
+        # ..., V+count, and step V on by count.  That is exactly what CTR
+        # mode, starting at V+1, gives as its keystream
+        start = ((self.V + 1) % 2**128).to_bytes(16, 'big')
+        cipher = self.Cipher(self.AES(self.key), self.CTR(start))
+        encryptor = cipher.encryptor()
+        self.V = (self.V + count) % 2**128
+        return encryptor.update(bytes(16 * count))
+
+    def update(self, provided_data):
+        # The CTR_DRBG_Update step: the next key and V are three blocks of
+        # keystream, xor'ed with provided_data (if any)
+        temp = self.blocks(3)
+        if provided_data is not None:
+            temp = bytes(a ^ b for a, b in zip(temp, provided_data))
+        self.key = temp[:32]
+        self.V = int.from_bytes(temp[32:], 'big')
+
+    def random_bytes(self, count):
+        with self.lock:
+            output = self.blocks((count + 15) // 16)[:count]
+            self.update(None)
+        return output
@@ -0,0 +1,160 @@
+#
+# Sorting networks, for sample_fixed_type
+#
+# sample_fixed_type picks a random polynomial of a fixed weight by sorting a
+# list of values whose upper bits are random (and whose two lsbits say what
+# the coefficient will be); the order the sort leaves them in is the random
+# arrangement.  The sort needs to take the same time whatever the values
+# are, which rules out Python's built-in sort (which looks at the values to
+# decide what to compare next)
+#
+# A sorting network always does the same compare-exchanges (a 'compare-
+# exchange' of x[i] and x[j] puts the smaller of the two in x[i], and the
+# larger in x[j]), in the same order, however the values compare.  We use
+# Batcher's bitonic network: for each block size k = 2, 4, 8, ..., N, there
+# are layers for j = k/2, ..., 2, 1, each of which compare-exchanges x[i]
+# with x[i+j] (for each i with bit j clear).  Within the blocks of k whose
+# index has bit k set, the exchange is the other way round (the larger goes
+# into x[i]).  After the layers for k, each block of k elements is sorted,
+# alternately ascending and descending, which is what the layers for 2k
+# need.  That's log2(N)*(log2(N)+1)/2 layers (55 for N = 1024), and the
+# compare-exchanges in each layer are independent of each other, so we do
+# them all at once
+# (an equivalent form of the network has the first layer for each k
+# compare x[i] with the element in the same place counted from the other
+# end of its block, and then everything sorts ascending)
+#
+# The network needs N to be a power of 2; we pad the values with the
+# largest possible value (which sorts to the end) to get there
+#
+# The values are at most 32 bits (30 random bits, and 2 bits of label)
+
+def network_size(count):
+    # The size of the network we use to sort count values
+    N = 1
+    while N < count:
+        N = 2*N
+    return N
+
+#
+# The version for Python lists.  Doing the compare-exchanges one at a time
+# would be slow (and Python's comparisons aren't constant time anyway); so
+# we put all N values into one big integer, each in its own w-bit field, and
+# do a whole layer of compare-exchanges with a few operations on big
+# integers ('SIMD within a register').  To compare-exchange field i with
+# field i+j:
+#  - A holds the fields with bit j of their index clear (the other fields
+#    zeroed); B holds the fields j above them, shifted down into the same
+#    places
+#  - Each field has a spare top bit (the 'guard' bit).  We set it in A and
+#    subtract B; as A and B are below 2**(w-1), no field borrows from its
+#    neighbour, and the guard bit survives in exactly the fields where A >= B
+#  - That gives us a mask of the fields where A < B, and so the fields where
+#    A and B need to be swapped to put the smaller in A
+# For the blocks that are sorted descending, we complement the values
+# before the layers for k (which reverses their order), sort everything
+# ascending, and complement them back afterwards
+network_width = 40          # The field width w (32 value bits, a guard
+                            # bit, and padding to a multiple of 8 bits)
+network_masks = {}          # The masks we use, by N; we only build them
+                            # the first time they are needed
+
+def build_network_masks(N):
+    # Return the masks for sorting N values: a list with one entry for each
+    # block size k, which is a pair (mask of the blocks that we complement,
+    # list of layers); each layer is (j*w, mask of the fields with bit j
+    # clear, the guard bits of those fields)
+    if N in network_masks:
+        return network_masks[N]
+    w = network_width
+    field = 2**(w-1) - 1
+    def mask(selected):
+        # The mask of all the fields i for which selected(i) is true
+        data = bytearray()
+        for i in range(N):
+            data += (field if selected(i) else 0).to_bytes(w//8, 'little')
+        return int.from_bytes(data, 'little')
+    stages = []
+    k = 2
+    while k <= N:
+        layers = []
+        j = k//2
+        while j >= 1:
+            M = mask(lambda i: not i & j)
+            layers.append((j*w, M, (M // field) << (w-1)))
+            j = j//2
+        stages.append((mask(lambda i: i & k), layers))
+        k = 2*k
+    network_masks[N] = stages
+    return stages
+
+def sort_network_list(values):
+    # Return the list of integers values (each between 0 and 2**32-1) in
+    # ascending order
+    N = network_size(len(values))
+    w = network_width
+    size = w//8
+    padding = (2**(w-1) - 1).to_bytes(size, 'little')  # Above any value
+    data = bytearray()
+    for v in values:
+        data += v.to_bytes(size, 'little')
+    X = int.from_bytes(data + padding * (N - len(values)), 'little')
+
+    for complement, layers in build_network_masks(N):
+        X = X ^ complement
+        for shift, M, guard in layers:
+            A = X & M
+            B = (X >> shift) & M
+            ge = (((A | guard) - B) & guard) >> (w-1)  # 1 where A >= B
+            swap = (A ^ B) & (M ^ ((ge << (w-1)) - ge))  # A^B where A < B
+            X = (B ^ swap) | ((A ^ swap) << shift)
+        X = X ^ complement
+
+    data = X.to_bytes(N * size, 'little')
+    result = []
+    for i in range(len(values)):
+        result.append(int.from_bytes(data[i*size:(i+1)*size], 'little'))
+    return result
+
+#
+# The version for NumPy arrays; here, each layer is a few whole-array
+# operations (and we use the form where everything sorts ascending).  This
+# sorts along the last axis, so that it can sort a whole batch of lists (the
+# rows of a matrix) at once.  We work on a copy with the sorting axis moved
+# to the front, so that each compare-exchange step operates on runs of
+# consecutive elements (the same position in every row)
+def sort_network_numpy(values):
+    # Return the array values (of uint32) sorted along its last axis
+    import numpy      # (only the numpy arithmetic calls this, and so it has
+                      # already been imported)
+    count = values.shape[-1]
+    N = network_size(count)
+    rest = values.shape[:-1]
+    x = numpy.full((N,) + rest, 2**32 - 1, dtype=numpy.uint32)
+    x[:count] = numpy.moveaxis(values, -1, 0)
+    smaller = numpy.empty((N//2,) + rest, dtype=numpy.uint32)
+
+    k = 2
+    while k <= N:
+        # Compare each element of each block with the one in the same
+        # place from the other end (b is a reversed view of the top half)
+        blocks = x.reshape((N//k, k) + rest)
+        a = blocks[:, :k//2]
+        b = blocks[:, k-1:k//2-1:-1]
+        s = smaller.reshape((N//k, k//2) + rest)
+        numpy.minimum(a, b, out=s)
+        numpy.maximum(a, b, out=b)
+        a[...] = s
+        j = k//4
+        while j >= 1:
+            # Compare each element with the one j places above it
+            pairs = x.reshape((N//(2*j), 2, j) + rest)
+            a = pairs[:, 0]
+            b = pairs[:, 1]
+            s = smaller.reshape((N//(2*j), j) + rest)
+            numpy.minimum(a, b, out=s)
+            numpy.maximum(a, b, out=b)
+            a[...] = s
+            j = j//2
+        k = 2*k
+    return numpy.moveaxis(x[:count], 0, -1)
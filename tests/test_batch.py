@@ -0,0 +1,21 @@
+#
+# The batched KEM routines (kem_encapsulate_many and kem_decapsulate_many)
+import pytest
+from ntru import NTRU_privatekey
+
+arithmetics = ['list', 'numpy']
+
+@pytest.mark.parametrize('arithmetic', arithmetics)
+def test_empty_batch(arithmetic):
+    key = NTRU_privatekey('hps2048509', arithmetic=arithmetic)
+    key.key_gen()
+    assert key.kem_encapsulate_many([]) == []
+    assert key.kem_decapsulate_many([]) == []
+
+@pytest.mark.parametrize('arithmetic', arithmetics)
+def test_batch_round_trip(arithmetic):
+    key = NTRU_privatekey('hps2048509', arithmetic=arithmetic)
+    public_key = key.key_gen()
+    pairs = key.kem_encapsulate_many([public_key] * 3)
+    assert key.kem_decapsulate_many([C for C, _ in pairs]) == \
+           [K for _, K in pairs]
@@ -0,0 +1,14 @@
+#
+# The benchmark suite's checks (rather than its timings)
+from ntru.bench import (compare_benchmarks, measure_import_time,
+                        import_time_budget)
+
+def test_import_time_budget():
+    assert measure_import_time() <= import_time_budget
+
+def test_import_time_regression():
+    results = {'import_time': 2 * import_time_budget, 'results': []}
+    regressions = compare_benchmarks(results, {'results': []})
+    assert len(regressions) == 1 and 'import ntru' in regressions[0]
+    results['import_time'] = import_time_budget / 2
+    assert compare_benchmarks(results, {'results': []}) == []
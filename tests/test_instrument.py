@@ -0,0 +1,44 @@
+#
+# The per-phase instrumentation (NTRU_instrumentation)
+import pickle
+import pytest
+from ntru import NTRU_privatekey
+from ntru.instrument import NTRU_instrumentation
+
+arithmetics = ['list', 'numpy']
+
+@pytest.mark.parametrize('arithmetic', arithmetics)
+def test_phases(arithmetic):
+    key = NTRU_privatekey('hps2048509', arithmetic=arithmetic)
+    with NTRU_instrumentation(key) as instrumentation:
+        public_key = key.key_gen()
+        C, K = key.kem_encapsulate(public_key)
+        assert key.kem_decapsulate(C) == K
+        phases = instrumentation.snapshot()
+    assert phases['key_gen']['count'] == 1
+    assert phases['kem_decapsulate']['count'] == 1
+    assert not any(name in vars(key) for name in instrumentation.methods)
+
+@pytest.mark.parametrize('arithmetic', arithmetics)
+def test_key_gen_many(arithmetic):
+    key = NTRU_privatekey('hps2048509', arithmetic=arithmetic)
+    instrumentation = NTRU_instrumentation(key)
+    keypairs = key.key_gen_many(3)
+    assert instrumentation.snapshot()['key_gen_many']['count'] == 1
+    for private_key, public_key in keypairs:
+        assert 'key_gen_finish' not in vars(private_key)
+        C, K = private_key.kem_encapsulate(public_key)
+        assert private_key.kem_decapsulate(C) == K
+    # The instrumented key itself is unchanged, and still works
+    assert key.kem_encapsulate_many([]) == []
+    instrumentation.detach()
+
+def test_pickle_instrumented():
+    key = NTRU_privatekey('hps2048509')
+    public_key = key.key_gen()
+    instrumentation = NTRU_instrumentation(key)
+    copy = pickle.loads(pickle.dumps(key))
+    C, K = copy.kem_encapsulate(public_key)
+    assert key.kem_decapsulate(C) == K
+    assert 'kem_decapsulate' in instrumentation.snapshot()
+    assert 'kem_encapsulate' not in instrumentation.snapshot()
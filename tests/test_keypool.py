@@ -0,0 +1,32 @@
+#
+# The key pool (NTRU_keypool)
+import pytest
+from ntru.keypool import NTRU_keypool
+
+class failing_rng:
+    # A source of randomness that always fails (but can be sent to the
+    # workers, so that it fails there)
+    def random_bytes(self, count):
+        raise RuntimeError('no randomness')
+
+def test_keypairs():
+    with NTRU_keypool('hps2048509', low_water=1, high_water=4,
+                      processes=2) as pool:
+        key, public_key = pool.get_keypair(timeout=60)
+        C, K = key.kem_encapsulate(public_key)
+        assert key.kem_decapsulate(C) == K
+
+def test_worker_always_fails():
+    with NTRU_keypool('hps2048509', low_water=1, high_water=4,
+                      processes=1, max_failures=3,
+                      rng=failing_rng()) as pool:
+        with pytest.raises(RuntimeError):
+            pool.get_keypair(timeout=60)
+        stats = pool.stats()
+        assert stats['failing']
+        # We stopped trying, rather than resubmitting the jobs forever
+        assert stats['errors'] <= 4
+        assert pool.try_get_keypair() is None
+        with pytest.raises(RuntimeError):
+            pool.get_keypair()
+        assert pool.stats()['errors'] == stats['errors']
@@ -0,0 +1,46 @@
+#
+# The command line (python -m ntru)
+import pytest
+from ntru import NTRU_privatekey
+from ntru.__main__ import main, read_records
+
+def records(path):
+    with open(path, 'rb') as file:
+        return list(read_records(file, 'binary'))
+
+def test_keygen_encaps_decaps(tmp_path):
+    keys = str(tmp_path / 'keys')
+    ciphertexts = str(tmp_path / 'ciphertexts')
+    secrets = str(tmp_path / 'secrets')
+    assert main(['keygen', '--set', 'hps2048509', '--count', '2',
+                 '--output', keys]) == 0
+    keypairs = records(keys)
+    assert len(keypairs) == 2
+    assert main(['encaps', '--set', 'hps2048509', '--input', keys,
+                 '--output', ciphertexts]) == 0
+    encapsulations = records(ciphertexts)
+    assert len(encapsulations) == 2
+    private_key = str(tmp_path / 'private_key')
+    with open(private_key, 'wb') as file:
+        file.write(keypairs[0][1])
+    assert main(['decaps', '--set', 'hps2048509', '--private-key',
+                 private_key, '--input', ciphertexts,
+                 '--output', secrets]) == 0
+    assert records(secrets)[0] == [encapsulations[0][1]]
+
+def test_encaps_public_key_default_count(tmp_path):
+    key = NTRU_privatekey('hps2048509')
+    public_key = str(tmp_path / 'public_key')
+    with open(public_key, 'wb') as file:
+        file.write(key.key_gen())
+    output = str(tmp_path / 'ciphertexts')
+    assert main(['encaps', '--set', 'hps2048509', '--public-key',
+                 public_key, '--output', output]) == 0
+    (C, K), = records(output)
+    assert key.kem_decapsulate(C) == K
+
+def test_bench_count(capsys):
+    with pytest.raises(SystemExit):
+        main(['bench', '--set', 'hps2048509', '--count', '0'])
+    assert main(['bench', '--set', 'hps2048509', '--count', '1']) == 0
+    assert 'decaps' in capsys.readouterr().out
@@ -0,0 +1,49 @@
+#
+# Packing and unpacking polynomials, and rejecting strings of the wrong
+# length
+import pytest
+from ntru import NTRU_privatekey
+
+decrypts = [{'arithmetic': 'list', 'fused_decrypt': True},
+            {'arithmetic': 'list', 'fused_decrypt': False},
+            {'arithmetic': 'numpy'}]
+
+@pytest.fixture(scope='module')
+def keys():
+    keys = []
+    for options in decrypts:
+        key = NTRU_privatekey('hps2048509', **options)
+        keys.append((key, key.key_gen()))
+    return keys
+
+def test_round_trip(keys):
+    for key, _ in keys:
+        R = key.sample_iid()
+        assert list(key.unpack_S3(key.pack_S3(R))) == [r for r in R[:-1]] + [0]
+        H = key.unpack_Rq0(key.pack_Rq0(key.H))
+        assert list(H) == list(key.H)
+
+@pytest.mark.parametrize('length', [0, 1, -1])
+def test_short_ciphertext(keys, length):
+    for key, public_key in keys:
+        C, _ = key.kem_encapsulate(public_key)
+        C = bytes(C)[:length]
+        with pytest.raises(ValueError):
+            key.kem_decapsulate(C)
+        with pytest.raises(ValueError):
+            key.kem_decapsulate_many([C])
+
+def test_short_strings(keys):
+    for key, _ in keys:
+        with pytest.raises(ValueError):
+            key.unpack_Rq0(bytes(key.packed_Rq0_bytes), 1)
+        with pytest.raises(ValueError):
+            key.unpack_S3(bytes(key.packed_S3_bytes - 1))
+        with pytest.raises(ValueError):
+            key.kem_encapsulate(bytes(key.packed_Rq0_bytes - 1))
+
+def test_long_ciphertext(keys):
+    # Anything past the end of the ciphertext is ignored
+    for key, public_key in keys:
+        C, K = key.kem_encapsulate(public_key)
+        assert key.kem_decapsulate(bytes(C) + b'\0') == K
@@ -0,0 +1,33 @@
+#
+# The compact polynomial type (NTRU_polynomial)
+import copy
+import pickle
+from ntru import NTRU_privatekey
+from ntru.poly import NTRU_polynomial
+
+def test_list_compatible():
+    key = NTRU_privatekey('hps2048509')
+    key.key_gen()
+    assert isinstance(key.H, NTRU_polynomial)
+    assert key.H == list(key.H) and not key.H != list(key.H)
+    assert key.F == tuple(key.F)
+    assert key.H != list(key.H)[:-1]
+    assert type(key.as_list(key.H)) is list
+    assert key.as_list(key.H) == list(key.H)
+
+def test_slices_keep_the_ring():
+    A = NTRU_polynomial([1, -1, 0, 5, 7], 3)
+    assert A == [1, -1, 0, -1, 1]
+    part = A[1:4]
+    assert isinstance(part, NTRU_polynomial) and part.modulus == 3
+    assert part == [-1, 0, -1]
+    assert A[::-1] == [1, -1, 0, -1, 1]
+    assert A[3] == -1
+
+def test_rings():
+    A = NTRU_polynomial([1, 2, 3], 2048)
+    B = NTRU_polynomial([1, -1, 0], 3)
+    assert A != NTRU_polynomial([1, 2, 3], 4096)
+    assert A + A == [2, 4, 6] and A * 2 == [2, 4, 6]
+    assert B * B == [1, 1, 1]
+    assert copy.copy(A) == A and pickle.loads(pickle.dumps(B)).modulus == 3
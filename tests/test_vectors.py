@@ -0,0 +1,14 @@
+#
+# The test vectors in the draft, against each arithmetic configuration
+import pytest
+from ntru.core import parameter_sets
+from ntru.bench import load_test_vectors, check_test_vectors, configurations
+
+vectors = load_test_vectors()
+covered = [name for name in parameter_sets if vectors.get(name)]
+
+@pytest.mark.parametrize('config', sorted(configurations()))
+@pytest.mark.parametrize('parameter_set', covered)
+def test_vectors(parameter_set, config):
+    assert check_test_vectors(parameter_set, configurations()[config],
+                              vectors)